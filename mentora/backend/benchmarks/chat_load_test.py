@@ -0,0 +1,259 @@
+"""Load-test the chat WebSocket with many simulated clients.
+
+Start the API (e.g. `uvicorn main:app`), then run from mentora/backend
+against the same DATABASE_URL:
+
+    python -m benchmarks.chat_load_test [--clients 200] [--group-size 10]
+        [--duration 30] [--rate 0.5] [--codec json|msgpack] [--url http://localhost:8000]
+
+The run seeds --clients users named "<prefix>-<n>". They are split into
+group threads of --group-size, with friendships inside each group, so
+presence fan-out is exercised too. Every client opens /chat/ws/{username}
+and sends to its group at --rate messages per second, with jitter. The
+send time travels in the message content, so end-to-end latency is
+measured at each receiver on the same clock.
+
+Reported: connect latency, delivery latency percentiles, sent and
+delivered messages/sec, dropped deliveries (expected minus received after
+a drain period) and the change in the server's /chat/stats counters. Seeded
+rows are deleted afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.request
+from collections import defaultdict
+
+import websockets
+
+from chat_archive import purge_thread
+from database import SessionLocal
+from models import ChatParticipant, ChatThread, Friend, Profile
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+STATS_COUNTERS = ("enqueued", "sent", "dropped", "slow_disconnects", "send_errors")
+
+
+def _seed(prefix: str, clients: int, group_size: int) -> dict[str, int]:
+    """Create users, friendships and group threads; returns username -> thread_id."""
+    usernames = [f"{prefix}-{n}" for n in range(clients)]
+    groups = [usernames[i : i + group_size] for i in range(0, clients, group_size)]
+    db = SessionLocal()
+    try:
+        db.add_all(
+            Profile(username=name, full_name=name, email=f"{name}@load.test")
+            for name in usernames
+        )
+        membership: dict[str, int] = {}
+        for members in groups:
+            thread = ChatThread(
+                user_a=members[0],
+                user_b=members[0],
+                is_group=True,
+                title=f"{prefix} group",
+                owner_username=members[0],
+            )
+            db.add(thread)
+            db.flush()
+            db.add_all(
+                ChatParticipant(thread_id=thread.thread_id, username=name) for name in members
+            )
+            db.add_all(
+                Friend(user_a=a, user_b=b)
+                for i, a in enumerate(members)
+                for b in members[i + 1 :]
+            )
+            membership.update({name: thread.thread_id for name in members})
+        db.commit()
+        return membership
+    finally:
+        db.close()
+
+
+def _cleanup(prefix: str, thread_ids: set[int]) -> None:
+    db = SessionLocal()
+    try:
+        for thread_id in thread_ids:
+            purge_thread(db, thread_id, force=True)
+        pattern = f"{prefix}-%"
+        db.query(Friend).filter(Friend.user_a.like(pattern)).delete(synchronize_session=False)
+        db.query(Profile).filter(Profile.username.like(pattern)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _server_stats(base_url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{base_url}/chat/stats", timeout=5) as response:
+            return json.loads(response.read())
+    except OSError:
+        return {}
+
+
+def _percentiles(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return (
+        f"p50 {at(0.50):.1f}ms  p95 {at(0.95):.1f}ms  "
+        f"p99 {at(0.99):.1f}ms  max {ordered[-1] * 1000:.1f}ms"
+    )
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, membership: dict[str, int]) -> None:
+        self.args = args
+        self.membership = membership
+        self.group_sizes: dict[int, int] = defaultdict(int)
+        for thread_id in membership.values():
+            self.group_sizes[thread_id] += 1
+        self.ws_url = args.url.replace("http", "ws", 1).rstrip("/")
+        self.connect_latency: list[float] = []
+        self.delivery_latency: list[float] = []
+        self.connect_failures = 0
+        self.sent = 0
+        self.expected = 0
+        self.received = 0
+        self.errors = 0
+        self.sending = True
+
+    def _decode(self, frame) -> dict:
+        if isinstance(frame, bytes):
+            return msgpack.unpackb(frame, raw=False)
+        return json.loads(frame)
+
+    def _encode(self, payload: dict):
+        if self.args.codec == "msgpack":
+            return msgpack.packb(payload, use_bin_type=True)
+        return json.dumps(payload)
+
+    async def _client(self, username: str, ready: asyncio.Event, rng: random.Random) -> None:
+        thread_id = self.membership[username]
+        subprotocols = ["mentora.msgpack"] if self.args.codec == "msgpack" else None
+        started = time.perf_counter()
+        try:
+            websocket = await websockets.connect(
+                f"{self.ws_url}/chat/ws/{username}",
+                subprotocols=subprotocols,
+                max_queue=None,
+            )
+        except Exception:
+            self.connect_failures += 1
+            return
+        self.connect_latency.append(time.perf_counter() - started)
+
+        async def receive() -> None:
+            async for frame in websocket:
+                payload = self._decode(frame)
+                kind = payload.get("type")
+                if kind == "message":
+                    self.received += 1
+                    sent_at = float(payload["message"]["content"].rsplit(" ", 1)[1])
+                    self.delivery_latency.append(time.time() - sent_at)
+                elif kind == "error":
+                    self.errors += 1
+
+        receiver = asyncio.create_task(receive())
+        try:
+            await ready.wait()
+            interval = 1 / self.args.rate
+            await asyncio.sleep(rng.uniform(0, interval))
+            while self.sending:
+                await websocket.send(
+                    self._encode(
+                        {"thread_id": thread_id, "content": f"load {username} {time.time()}"}
+                    )
+                )
+                self.sent += 1
+                self.expected += self.group_sizes[thread_id]
+                await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+            await asyncio.sleep(self.args.drain)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            receiver.cancel()
+            await websocket.close()
+
+    async def run(self) -> None:
+        rng = random.Random(self.args.seed)
+        ready = asyncio.Event()
+        tasks = [
+            asyncio.create_task(
+                self._client(username, ready, random.Random(rng.random()))
+            )
+            for username in self.membership
+        ]
+        # Let every socket connect before traffic starts.
+        while len(self.connect_latency) + self.connect_failures < len(tasks):
+            await asyncio.sleep(0.05)
+        before = _server_stats(self.args.url)
+        ready.set()
+        started = time.perf_counter()
+        await asyncio.sleep(self.args.duration)
+        self.sending = False
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*tasks, return_exceptions=True)
+        after = _server_stats(self.args.url)
+        self.report(elapsed, before, after)
+
+    def report(self, elapsed: float, before: dict, after: dict) -> None:
+        args = self.args
+        dropped = max(0, self.expected - self.received)
+        print(
+            f"clients {len(self.membership)}  groups {len(self.group_sizes)}  "
+            f"codec {args.codec}  duration {elapsed:.1f}s"
+        )
+        print(f"connect   {_percentiles(self.connect_latency)}  failures {self.connect_failures}")
+        print(f"delivery  {_percentiles(self.delivery_latency)}")
+        print(
+            f"sent      {self.sent} ({self.sent / elapsed:.1f} msg/s)  "
+            f"delivered {self.received} ({self.received / elapsed:.1f} msg/s)"
+        )
+        print(
+            f"dropped   {dropped} of {self.expected} expected "
+            f"({dropped / max(1, self.expected):.2%})  error frames {self.errors}"
+        )
+        if before and after:
+            deltas = "  ".join(
+                f"{name} {after.get(name, 0) - before.get(name, 0)}" for name in STATS_COUNTERS
+            )
+            print(f"server    {deltas}  max_queue_depth {after.get('max_queue_depth')}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--group-size", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--rate", type=float, default=0.5, help="messages/sec per client")
+    parser.add_argument("--drain", type=float, default=2, help="seconds to wait for deliveries")
+    parser.add_argument("--codec", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prefix", default="loadtest")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+    if args.codec == "msgpack" and msgpack is None:
+        parser.error("--codec msgpack needs the msgpack package")
+
+    membership = _seed(args.prefix, args.clients, args.group_size)
+    try:
+        asyncio.run(LoadTest(args, membership).run())
+    finally:
+        if not args.keep:
+            _cleanup(args.prefix, set(membership.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare chat message throughput: commit-per-message vs write-behind batches.
+
+Run from mentora/backend against the database in DATABASE_URL:
+
+    python -m benchmarks.chat_write_path [--messages 2000] [--senders 50]
+
+A scratch thread is created for the run and deleted afterwards. Both modes
+go through the same code the WebSocket handler uses: `_persist_message`
+on the DB thread pool for the direct path, and `MessageWriter` for the
+write-behind path.
+"""
+import argparse
+import asyncio
+import time
+
+from chat_writer import MessageWriter
+from database import SessionLocal, run_in_db
+from models import ChatMessage, ChatThread
+from routers.chat_router import _persist_message
+
+SENDER = "bench-sender"
+
+
+def _create_thread() -> int:
+    db = SessionLocal()
+    try:
+        thread = ChatThread(user_a=SENDER, user_b=SENDER, is_group=True, title="bench")
+        db.add(thread)
+        db.commit()
+        return thread.thread_id
+    finally:
+        db.close()
+
+
+def _drop_thread(thread_id: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(ChatMessage).filter(ChatMessage.thread_id == thread_id).delete()
+        db.query(ChatThread).filter(ChatThread.thread_id == thread_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _drive(send, messages: int, senders: int) -> float:
+    per_sender = messages // senders
+
+    async def sender(index: int) -> None:
+        for n in range(per_sender):
+            await send(f"bench {index}-{n}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(i) for i in range(senders)))
+    return time.perf_counter() - started
+
+
+async def run(messages: int, senders: int, batch: int, interval_ms: int) -> None:
+    thread_id = _create_thread()
+    try:
+        async def direct(content: str) -> None:
+            await run_in_db(_persist_message, SENDER, thread_id, content)
+
+        elapsed = await _drive(direct, messages, senders)
+        total = (messages // senders) * senders
+        print(f"direct        {total / elapsed:10.1f} msg/s  ({total} in {elapsed:.2f}s)")
+
+        writer = MessageWriter(batch, interval_ms)
+
+        async def buffered(content: str) -> None:
+            await writer.submit(thread_id, SENDER, content)
+
+        started = time.perf_counter()
+        accepted = await _drive(buffered, messages, senders)
+        await writer.stop()
+        durable = time.perf_counter() - started
+        stats = writer.stats()
+        print(
+            f"write-behind  {total / accepted:10.1f} msg/s accepted, "
+            f"{total / durable:.1f} msg/s committed  "
+            f"({stats['batches']} batches, {stats['flush_errors']} flush errors)"
+        )
+    finally:
+        _drop_thread(thread_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--interval-ms", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.senders, args.batch, args.interval_ms))
+
+
+if __name__ == "__main__":
+    main()
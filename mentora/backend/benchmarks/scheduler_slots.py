@@ -0,0 +1,104 @@
+"""Micro-benchmark: list-of-bools fit search vs the FreeSlots bitmask index.
+
+Run from mentora/backend:
+
+    python -m benchmarks.scheduler_slots [--weeks 2000] [--density 0.6] [--seed 7]
+
+Each synthetic week has 7 days of 28 slots (08:00-22:00). Course blocks
+cover roughly --density of each day. Both implementations replay the same
+placement workload: for each session, find every fit of 1-4 slots, pick
+one, and mark it occupied. Their results are checked to be identical.
+"""
+import argparse
+import random
+import time
+
+from schedule_planner import FreeSlots
+
+SLOTS_PER_DAY = 28
+
+
+def _list_fits(slots: list, blocks_needed: int) -> list:
+    # The pre-FreeSlots implementation, kept here as the baseline.
+    valid = []
+    for i in range(len(slots) - blocks_needed + 1):
+        if all(slots[i:i + blocks_needed]):
+            valid.append(i)
+    return valid
+
+
+def _synthetic_days(weeks: int, density: float, seed: int) -> list[list[bool]]:
+    rng = random.Random(seed)
+    days = []
+    for _ in range(weeks * 7):
+        slots = [True] * SLOTS_PER_DAY
+        while slots.count(False) < density * SLOTS_PER_DAY:
+            start = rng.randrange(SLOTS_PER_DAY)
+            for i in range(start, min(SLOTS_PER_DAY, start + rng.randint(2, 4))):
+                slots[i] = False
+        days.append(slots)
+    return days
+
+
+def _workload(seed: int, days: int) -> list[list[int]]:
+    rng = random.Random(seed)
+    return [[rng.randint(1, 4) for _ in range(rng.randint(2, 6))] for _ in range(days)]
+
+
+def _run_list(days: list[list[bool]], sessions: list[list[int]]) -> tuple[float, list]:
+    picks = []
+    started = time.perf_counter()
+    for day, lengths in zip(days, sessions):
+        slots = list(day)
+        for length in lengths:
+            fits = _list_fits(slots, length)
+            if not fits:
+                picks.append(None)
+                continue
+            fit = fits[len(fits) // 2]
+            for i in range(fit, fit + length):
+                slots[i] = False
+            picks.append(fit)
+    return time.perf_counter() - started, picks
+
+
+def _run_bitmask(days: list[FreeSlots], sessions: list[list[int]]) -> tuple[float, list]:
+    picks = []
+    started = time.perf_counter()
+    for day, lengths in zip(days, sessions):
+        slots = day.copy()
+        for length in lengths:
+            fits = slots.fits(length)
+            if not fits:
+                picks.append(None)
+                continue
+            fit = fits[len(fits) // 2]
+            slots.occupy(fit, length)
+            picks.append(fit)
+    return time.perf_counter() - started, picks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=2000)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for density in sorted({0.0, 0.3, args.density}):
+        days = _synthetic_days(args.weeks, density, args.seed)
+        masks = [FreeSlots.from_bools(day) for day in days]
+        sessions = _workload(args.seed, len(days))
+        list_time, list_picks = _run_list(days, sessions)
+        mask_time, mask_picks = _run_bitmask(masks, sessions)
+        assert list_picks == mask_picks, "implementations disagree"
+        placements = sum(pick is not None for pick in list_picks)
+        print(
+            f"density {density:.1f}  {len(list_picks)} sessions ({placements} placed)  "
+            f"list {list_time * 1000:8.1f}ms  bitmask {mask_time * 1000:8.1f}ms  "
+            f"speedup {list_time / mask_time:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Benchmark the scheduler's planning core on seeded synthetic timetables.
+
+Run from mentora/backend:
+
+    python -m benchmarks.scheduler_suite [--weeks 200] [--repeat 5] [--seed 11]
+        [--placers optimal,random] [--json results.json]
+        [--compare baseline.json] [--tolerance 0.25]
+
+Every synthetic week has 5-12 courses with random ECTS. It is a "sparse",
+"medium" or "dense" week of course blocks (1-2, 2-3 or 3-5 blocks of 1-3
+hours per course). It also gets a personality/emotion combination from a
+fixed grid. The same weeks are planned by each placer by calling
+schedule_planner.plan_week directly, with no HTTP and no database.
+
+One row per density x course-count group x placer reports:
+- p50 build/assign/place times and p95 total, in ms. Each week is
+  planned --repeat times and its fastest run counts, which keeps
+  sub-millisecond timings steady between runs.
+- the share of requested sessions and focus minutes that were placed;
+- allocations per plan, from a separate untimed pass: the tracemalloc
+  peak in KiB and the memory blocks still held by the returned plan.
+
+--json saves the rows. --compare reads a saved run and exits with status
+1 when a row regresses by more than --tolerance: its p50 total time or its
+peak memory is that much higher, or it places over 0.5 points less of the
+requested focus time. Times are compared after dividing by a fixed
+pure-Python reference workload, timed just before each row. This cancels
+machine speed and background load, which otherwise swing sub-millisecond
+timings by 30% or more between identical runs. A row that fails is
+measured again up to twice, and is reported only if it fails every time.
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+from schedule_planner import WEEK_DAYS, make_placer, plan_week
+
+WEEK_START = date(2026, 1, 5)  # a Monday; planning never looks at today's date
+DENSITIES = {"sparse": (1, 2), "medium": (2, 3), "dense": (3, 5)}
+COURSE_GROUPS = ((5, 7), (8, 10), (11, 12))
+PERSONALITY_LEVELS = (1.5, 3.0, 4.5)
+EMOTIONS = (
+    None,
+    {"joy": 0.8, "neutral": 0.1, "sadness": 0.05},
+    {"joy": 0.1, "neutral": 0.7},
+    {"sadness": 0.5, "fear": 0.2, "neutral": 0.2},
+    {"anger": 0.3, "disgust": 0.2, "joy": 0.3, "neutral": 0.2},
+)
+ECTS_CHOICES = (0, 2, 3, 4, 5, 6, 7.5, 8, 10)
+RECHECKS = 2
+
+
+def _week(rng: random.Random, courses: int, density: str) -> dict:
+    low, high = DENSITIES[density]
+    course_list = []
+    availability: dict[str, list[dict]] = {}
+    for i in range(courses):
+        name = f"C{i}"
+        course_list.append({"name": name, "ects": rng.choice(ECTS_CHOICES)})
+        for _ in range(rng.randint(low, high)):
+            day = rng.choice(WEEK_DAYS[:5] if rng.random() < 0.9 else WEEK_DAYS[5:])
+            start = rng.randrange(8 * 60 + 30, 20 * 60, 30)
+            end = min(22 * 60, start + rng.choice((60, 90, 120, 180)) - 10)
+            availability.setdefault(day, []).append(
+                {
+                    "start": f"{start // 60:02d}:{start % 60:02d}",
+                    "end": f"{end // 60:02d}:{end % 60:02d}",
+                    "course": name,
+                }
+            )
+    return {
+        "courses": course_list,
+        "availability": availability,
+        "personality": {
+            "conscientiousness": rng.choice(PERSONALITY_LEVELS),
+            "neuroticism": rng.choice(PERSONALITY_LEVELS),
+        },
+        "emotion": rng.choice(EMOTIONS),
+    }
+
+
+def _weeks(count: int, seed: int) -> dict[tuple[str, str], list[dict]]:
+    rng = random.Random(seed)
+    groups = {}
+    for density in DENSITIES:
+        for low, high in COURSE_GROUPS:
+            groups[(density, f"{low}-{high}")] = [
+                _week(rng, rng.randint(low, high), density) for _ in range(count)
+            ]
+    return groups
+
+
+def _plan(week: dict, placer: str, seed: int) -> dict:
+    return plan_week(
+        WEEK_START,
+        [dict(course) for course in week["courses"]],
+        week["availability"],
+        week["personality"],
+        week["emotion"],
+        make_placer(placer, seed=seed),
+    )
+
+
+def _pct(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def _reference_ms(repeat: int) -> float:
+    """Fastest of `repeat` runs of a fixed workload unrelated to the planner."""
+    rng = random.Random(0)
+    data = [rng.random() for _ in range(20000)]
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        counts: dict[int, int] = {}
+        for value in sorted(data):
+            key = int(value * 1000)
+            counts[key] = counts.get(key, 0) + 1
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run_group(weeks: list[dict], placer: str, repeat: int) -> dict:
+    reference = _reference_ms(repeat)
+    timings: dict[str, list[float]] = {"build": [], "assign": [], "place": [], "total": []}
+    requested_sessions = placed_sessions = requested_focus = placed_focus = 0
+    for i, week in enumerate(weeks):
+        runs = [_plan(week, placer, i)["stats"] for _ in range(repeat)]
+        for phase in timings:
+            timings[phase].append(min(stats["timings_ms"][phase] for stats in runs))
+        stats = runs[0]
+        requested_sessions += stats["requested_sessions"]
+        placed_sessions += stats["placed_sessions"]
+        requested_focus += stats["requested_focus_minutes"]
+        placed_focus += stats["placed_focus_minutes"]
+
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    for i, week in enumerate(weeks):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        live = sys.getallocatedblocks()
+        plan = _plan(week, placer, i)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        blocks.append(sys.getallocatedblocks() - live)
+        del plan
+    tracemalloc.stop()
+
+    return {
+        "weeks": len(weeks),
+        "build_p50": _pct(timings["build"], 0.5),
+        "assign_p50": _pct(timings["assign"], 0.5),
+        "place_p50": _pct(timings["place"], 0.5),
+        "total_p50": _pct(timings["total"], 0.5),
+        "total_p95": _pct(timings["total"], 0.95),
+        "reference_ms": reference,
+        "sessions_placed": placed_sessions / max(1, requested_sessions),
+        "focus_placed": placed_focus / max(1, requested_focus),
+        "peak_kib": sum(peaks) / len(peaks) / 1024,
+        "plan_blocks": sum(blocks) / len(blocks),
+    }
+
+
+def _regressions(key: str, row: dict, base: dict, tolerance: float) -> list[str]:
+    problems = []
+    relative = (row["total_p50"] / row["reference_ms"]) / (base["total_p50"] / base["reference_ms"])
+    if relative > 1 + tolerance:
+        problems.append(
+            f"{key}: p50 total {row['total_p50']:.3f}ms vs {base['total_p50']:.3f}ms "
+            f"({relative - 1:+.0%} after normalizing)"
+        )
+    if row["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+        problems.append(f"{key}: peak {row['peak_kib']:.1f}KiB vs {base['peak_kib']:.1f}KiB")
+    if row["focus_placed"] < base["focus_placed"] - 0.005:
+        problems.append(
+            f"{key}: focus placed {row['focus_placed']:.1%} vs {base['focus_placed']:.1%}"
+        )
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=200, help="weeks per density/course group")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per week; the fastest counts")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--placers", default="optimal,random")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # Weeks with no free slot log a fallback warning; they are expected here.
+    logging.getLogger("mentora.scheduler").setLevel(logging.ERROR)
+    groups = _weeks(args.weeks, args.seed)
+    rows = {}
+    print(
+        f"{'density':<8} {'courses':<7} {'placer':<8} {'build':>7} {'assign':>7} {'place':>7} "
+        f"{'total':>7} {'p95':>7}  {'sessions':>8} {'focus':>6}  {'peakKiB':>7} {'blocks':>7}"
+    )
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    problems = []
+    for (density, courses), weeks in groups.items():
+        for placer in args.placers.split(","):
+            key = f"{density}/{courses}/{placer}"
+            row = run_group(weeks, placer, args.repeat)
+            if key in baseline:
+                # A slow row is measured again; only a regression that repeats counts.
+                found = _regressions(key, row, baseline[key], args.tolerance)
+                for _ in range(RECHECKS):
+                    if not found:
+                        break
+                    row = run_group(weeks, placer, args.repeat)
+                    found = _regressions(key, row, baseline[key], args.tolerance)
+                problems.extend(found)
+            rows[key] = row
+            print(
+                f"{density:<8} {courses:<7} {placer:<8} {row['build_p50']:7.3f} "
+                f"{row['assign_p50']:7.3f} {row['place_p50']:7.3f} {row['total_p50']:7.3f} "
+                f"{row['total_p95']:7.3f}  {row['sessions_placed']:8.1%} {row['focus_placed']:6.1%}  "
+                f"{row['peak_kib']:7.1f} {row['plan_blocks']:7.0f}"
+            )
+    print("times are p50 milliseconds per planned week unless marked p95")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
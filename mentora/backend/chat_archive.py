@@ -0,0 +1,247 @@
+"""Cold archive tier for chat history.
+
+Messages older than CHAT_ARCHIVE_AFTER_DAYS are moved out of chat_messages
+by jobs/archive_chat_messages.py. Each thread/month becomes one or more
+ChatMessageArchive rows of zlib-compressed JSON. The hot table then holds
+only recent history (plus each thread's latest message, which the inbox
+joins on), so its indexes stay small.
+
+Archived messages are still reachable: `_history_page` in the chat router
+falls through to `archived_before` / `archived_after` when the hot table
+runs out. They are not part of full-text search or delta sync, which only
+ever look at recent messages.
+
+Deleting a thread is two steps. `mark_deleted` removes its participants
+and stamps deleted_at in the caller's transaction, so the thread is gone
+for everyone at once. `purge_thread` then deletes its history in batches
+and finally the thread row, from a background task or
+jobs/purge_deleted_threads.py.
+"""
+from __future__ import annotations
+
+import json
+import zlib
+from datetime import date, datetime
+from itertools import groupby
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import ChatMessage, ChatMessageArchive, ChatParticipant, ChatThread
+
+SortKey = tuple[datetime, int]
+
+
+def _encode(messages: list[ChatMessage]) -> bytes:
+    rows = [
+        [m.message_id, m.sender, m.content, m.created_at.isoformat(), m.client_key]
+        for m in messages
+    ]
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode(chunk: ChatMessageArchive) -> list[dict]:
+    rows = json.loads(zlib.decompress(chunk.payload).decode("utf-8"))
+    return [
+        {
+            "message_id": message_id,
+            "thread_id": chunk.thread_id,
+            "sender": sender,
+            "content": content,
+            "created_at": datetime.fromisoformat(created_at),
+            "client_key": client_key,
+        }
+        for message_id, sender, content, created_at, client_key in rows
+    ]
+
+
+def _key(row: dict) -> SortKey:
+    return row["created_at"], row["message_id"]
+
+
+def archive_thread(db: Session, thread_id: int, cutoff: datetime, chunk_size: int) -> int:
+    """Move a thread's messages older than `cutoff` into the archive.
+
+    Works `chunk_size` messages at a time. Each chunk's archive rows and the
+    matching delete commit together, so the job can stop at any point.
+    Returns the number of messages moved.
+    """
+    last_message_id = (
+        db.query(ChatThread.last_message_id)
+        .filter(ChatThread.thread_id == thread_id)
+        .scalar()
+    )
+    moved = 0
+    while True:
+        query = db.query(ChatMessage).filter(
+            ChatMessage.thread_id == thread_id,
+            ChatMessage.created_at < cutoff,
+        )
+        if last_message_id is not None:
+            query = query.filter(ChatMessage.message_id != last_message_id)
+        messages = (
+            query.order_by(ChatMessage.created_at.asc(), ChatMessage.message_id.asc())
+            .limit(chunk_size)
+            .all()
+        )
+        if not messages:
+            return moved
+
+        for month, group in groupby(
+            messages, key=lambda m: date(m.created_at.year, m.created_at.month, 1)
+        ):
+            group = list(group)
+            ids = [m.message_id for m in group]
+            db.add(
+                ChatMessageArchive(
+                    thread_id=thread_id,
+                    month=month,
+                    min_message_id=min(ids),
+                    max_message_id=max(ids),
+                    first_created_at=group[0].created_at,
+                    last_created_at=group[-1].created_at,
+                    message_count=len(group),
+                    payload=_encode(group),
+                )
+            )
+        db.execute(
+            delete(ChatMessage).where(
+                ChatMessage.message_id.in_([m.message_id for m in messages])
+            )
+        )
+        db.commit()
+        db.expunge_all()
+        moved += len(messages)
+
+
+def find_archived(db: Session, thread_id: int, message_id: int) -> Optional[dict]:
+    chunks = (
+        db.query(ChatMessageArchive)
+        .filter(
+            ChatMessageArchive.thread_id == thread_id,
+            ChatMessageArchive.min_message_id <= message_id,
+            ChatMessageArchive.max_message_id >= message_id,
+        )
+        .all()
+    )
+    for chunk in chunks:
+        for row in _decode(chunk):
+            if row["message_id"] == message_id:
+                return row
+    return None
+
+
+def archived_before(
+    db: Session,
+    thread_id: int,
+    before: Optional[SortKey],
+    limit: int,
+) -> list[dict]:
+    """The newest `limit` archived messages older than `before`, oldest first."""
+    query = db.query(ChatMessageArchive).filter(ChatMessageArchive.thread_id == thread_id)
+    if before is not None:
+        query = query.filter(ChatMessageArchive.first_created_at <= before[0])
+    query = query.order_by(
+        ChatMessageArchive.last_created_at.desc(),
+        ChatMessageArchive.archive_id.desc(),
+    )
+    collected: list[dict] = []
+    for chunk in query.yield_per(8):
+        rows = [row for row in _decode(chunk) if before is None or _key(row) < before]
+        collected.extend(rows)
+        if len(collected) >= limit:
+            break
+    collected.sort(key=_key)
+    return collected[-limit:] if limit else []
+
+
+def archived_after(
+    db: Session,
+    thread_id: int,
+    after: SortKey,
+    limit: int,
+) -> list[dict]:
+    """The oldest `limit` archived messages newer than `after`, oldest first."""
+    query = (
+        db.query(ChatMessageArchive)
+        .filter(
+            ChatMessageArchive.thread_id == thread_id,
+            ChatMessageArchive.last_created_at >= after[0],
+        )
+        .order_by(
+            ChatMessageArchive.first_created_at.asc(),
+            ChatMessageArchive.archive_id.asc(),
+        )
+    )
+    collected: list[dict] = []
+    for chunk in query.yield_per(8):
+        collected.extend(row for row in _decode(chunk) if _key(row) > after)
+        if len(collected) >= limit:
+            break
+    collected.sort(key=_key)
+    return collected[:limit]
+
+
+def mark_deleted(db: Session, thread_id: int) -> None:
+    """Drop a thread's participants and stamp deleted_at; the caller commits."""
+    db.execute(delete(ChatParticipant).where(ChatParticipant.thread_id == thread_id))
+    db.execute(
+        update(ChatThread)
+        .where(ChatThread.thread_id == thread_id)
+        .values(deleted_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def purge_thread(
+    db: Session, thread_id: int, batch_size: int = 5000, force: bool = False
+) -> int:
+    """Delete a deleted thread's messages and then the thread row itself.
+
+    Archive chunks go in one statement (a few rows per month). Hot rows are
+    deleted in message_id batches along (thread_id, message_id), committing
+    every `batch_size` rows, so a big group never holds one huge delete
+    transaction open. Returns the hot rows deleted.
+
+    Only threads already marked deleted are purged; any other thread is left
+    alone and 0 is returned, so a stray call cannot wipe a live thread.
+    Tooling that owns its threads (benchmarks, test fixtures) passes
+    `force=True`, which runs `mark_deleted` and commits first.
+    """
+    deleted_at = db.execute(
+        select(ChatThread.deleted_at).where(ChatThread.thread_id == thread_id)
+    ).scalar()
+    if deleted_at is None:
+        if not force:
+            return 0
+        mark_deleted(db, thread_id)
+        db.commit()
+    db.execute(delete(ChatMessageArchive).where(ChatMessageArchive.thread_id == thread_id))
+    deleted = 0
+    while True:
+        ids = db.execute(
+            select(ChatMessage.message_id)
+            .where(ChatMessage.thread_id == thread_id)
+            .order_by(ChatMessage.message_id.asc())
+            .limit(batch_size)
+        ).scalars().all()
+        if ids:
+            db.execute(delete(ChatMessage).where(ChatMessage.message_id.in_(ids)))
+            db.commit()
+            deleted += len(ids)
+            continue
+        db.execute(delete(ChatThread).where(ChatThread.thread_id == thread_id))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # A buffered message may have landed after the last batch; go
+            # round again for that, but not for anything else.
+            if db.execute(
+                select(ChatMessage.message_id).where(ChatMessage.thread_id == thread_id).limit(1)
+            ).first() is None:
+                raise
+            continue
+        return deleted
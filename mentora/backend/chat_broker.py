@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.engine import make_url
+
+from config import CHAT_BROKER, CHAT_BROKER_CHANNEL, DATABASE_URL
+
+logger = logging.getLogger("mentora.chat")
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+MAX_NOTIFY_BYTES = 7900
+# Larger events go out as several "#<id> <part> <parts> <data>" payloads.
+CHUNK_PREFIX = "#"
+CHUNK_DATA_BYTES = MAX_NOTIFY_BYTES - 64
+
+
+class InProcessBroker:
+    """Single-worker broker: published events are handed straight back."""
+
+    def __init__(self) -> None:
+        self._handler: Optional[EventHandler] = None
+
+    async def start(self, handler: EventHandler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._handler = None
+
+    async def publish(self, event: dict) -> None:
+        if self._handler is not None:
+            await self._handler(event)
+
+
+class PostgresBroker:
+    """Multi-worker broker built on Postgres LISTEN/NOTIFY.
+
+    Every worker listens on the same channel, so an event published on any
+    worker is received exactly once by each worker (including the sender),
+    which then delivers it to the sockets it holds locally. Events over
+    MAX_NOTIFY_BYTES (long messages, big groups) are split into chunks that
+    are sent in one transaction, so listeners get all of them or none, and
+    are joined again before dispatch.
+    """
+
+    def __init__(self, database_url: str, channel: str) -> None:
+        url = make_url(database_url).set(drivername="postgresql")
+        self._dsn = url.render_as_string(hide_password=False)
+        self._channel = channel
+        self._handler: Optional[EventHandler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(self._dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    async def start(self, handler: EventHandler) -> None:
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._publish_conn = await asyncio.to_thread(self._connect)
+        ready = threading.Event()
+        self._listener = threading.Thread(
+            target=self._listen_forever,
+            args=(ready,),
+            name="chat-broker-listener",
+            daemon=True,
+        )
+        self._listener.start()
+        await asyncio.to_thread(ready.wait, 10)
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._listener is not None:
+            await asyncio.to_thread(self._listener.join, 5)
+            self._listener = None
+        if self._publish_conn is not None:
+            self._publish_conn.close()
+            self._publish_conn = None
+
+    async def publish(self, event: dict) -> None:
+        # ensure_ascii (the default) keeps one byte per character.
+        data = json.dumps(event, default=str)
+        if len(data) <= MAX_NOTIFY_BYTES:
+            payloads = [data]
+        else:
+            chunk_id = uuid.uuid4().hex
+            parts = range(0, len(data), CHUNK_DATA_BYTES)
+            payloads = [
+                f"{CHUNK_PREFIX}{chunk_id} {i} {len(parts)} {data[start:start + CHUNK_DATA_BYTES]}"
+                for i, start in enumerate(parts)
+            ]
+        await asyncio.to_thread(self._notify, payloads)
+
+    def _notify(self, payloads: list[str]) -> None:
+        # One statement in autocommit mode is one transaction: Postgres
+        # delivers all of its notifications together, after the commit.
+        query = "SELECT " + ", ".join(["pg_notify(%s, %s)"] * len(payloads))
+        params = [value for data in payloads for value in (self._channel, data)]
+        with self._publish_lock:
+            try:
+                with self._publish_conn.cursor() as cur:
+                    cur.execute(query, params)
+            except Exception:
+                logger.exception("NOTIFY failed; reconnecting publisher")
+                self._publish_conn = self._connect()
+                with self._publish_conn.cursor() as cur:
+                    cur.execute(query, params)
+
+    def _listen_forever(self, ready: threading.Event) -> None:
+        while not self._stopped.is_set():
+            conn = None
+            chunks: dict[str, dict[int, str]] = {}
+            try:
+                conn = self._connect()
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self._channel}"')
+                ready.set()
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        raw = self._join(chunks, conn.notifies.pop(0).payload)
+                        if raw is not None:
+                            self._dispatch(raw)
+            except Exception:
+                logger.exception("Chat broker listener failed; reconnecting")
+                self._stopped.wait(1.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    @staticmethod
+    def _join(chunks: dict[str, dict[int, str]], raw: str) -> Optional[str]:
+        """The full event once every chunk of it has arrived, else None."""
+        if not raw.startswith(CHUNK_PREFIX):
+            return raw
+        try:
+            chunk_id, part, parts, data = raw[len(CHUNK_PREFIX):].split(" ", 3)
+            part, parts = int(part), int(parts)
+        except ValueError:
+            logger.error("Dropping malformed chat event chunk: %s", raw[:200])
+            return None
+        received = chunks.setdefault(chunk_id, {})
+        received[part] = data
+        if len(received) < parts:
+            return None
+        del chunks[chunk_id]
+        return "".join(received[i] for i in range(parts))
+
+    def _dispatch(self, raw: str) -> None:
+        try:
+            event = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.error("Dropping malformed chat event: %s", raw[:200])
+            return
+        if self._handler is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._handler(event), self._loop)
+
+
+def create_broker():
+    if CHAT_BROKER == "postgres":
+        return PostgresBroker(DATABASE_URL, CHAT_BROKER_CHANNEL)
+    if CHAT_BROKER != "memory":
+        logger.warning("Unknown CHAT_BROKER %r; using in-process broker", CHAT_BROKER)
+    return InProcessBroker()
@@ -0,0 +1,95 @@
+"""Wire codecs for the chat WebSocket.
+
+JSON text frames are the default. A client that wants the compact protocol
+either offers the "mentora.msgpack" subprotocol (Sec-WebSocket-Protocol) or
+connects with ?codec=msgpack. Frames then travel as MessagePack binary
+frames in both directions, with the same shape as the JSON frames. If
+msgpack is not installed, the server answers with JSON.
+
+Compression is permessage-deflate, negotiated by the server during the
+handshake. uvicorn's websockets implementation enables it by default
+(--ws-per-message-deflate), so it covers both codecs without any code here.
+
+History replay uses `batch_messages`: one frame for many messages, with the
+field names listed once and each message as a row of values.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Optional, Union
+
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for the compact protocol
+    msgpack = None
+
+JSON_SUBPROTOCOL = "mentora.json"
+MSGPACK_SUBPROTOCOL = "mentora.msgpack"
+
+MESSAGE_FIELDS = ("message_id", "thread_id", "sender", "content", "created_at")
+
+
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    @staticmethod
+    def encode(payload: dict) -> str:
+        return json.dumps(payload, separators=(",", ":"))
+
+    @staticmethod
+    def decode(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    @staticmethod
+    def encode(payload: dict) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    @staticmethod
+    def decode(data: Union[str, bytes]) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        return msgpack.unpackb(data, raw=False)
+
+
+def negotiate(websocket: WebSocket) -> tuple[type, Optional[str]]:
+    """Pick the codec for a socket and the subprotocol to accept it with."""
+    offered = websocket.scope.get("subprotocols") or []
+    wants_msgpack = (
+        MSGPACK_SUBPROTOCOL in offered
+        or websocket.query_params.get("codec") == "msgpack"
+    )
+    if wants_msgpack and msgpack is not None:
+        return MsgpackCodec, MSGPACK_SUBPROTOCOL if MSGPACK_SUBPROTOCOL in offered else None
+    return JsonCodec, JSON_SUBPROTOCOL if JSON_SUBPROTOCOL in offered else None
+
+
+class Frame:
+    """An outbound payload, encoded at most once per codec however many sockets get it."""
+
+    __slots__ = ("payload", "_encoded")
+
+    def __init__(self, payload: dict) -> None:
+        self.payload = payload
+        self._encoded: dict[str, Union[str, bytes]] = {}
+
+    def encode(self, codec) -> Union[str, bytes]:
+        data = self._encoded.get(codec.name)
+        if data is None:
+            data = self._encoded[codec.name] = codec.encode(self.payload)
+        return data
+
+
+def batch_messages(messages: list[dict]) -> dict:
+    """Columnar form of a message list: {"fields": [...], "rows": [[...], ...]}."""
+    return {
+        "fields": list(MESSAGE_FIELDS),
+        "rows": [[message[field] for field in MESSAGE_FIELDS] for message in messages],
+    }
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import CHAT_CLIENT_KEY_TTL, CHAT_CLIENT_KEY_WINDOW
+
+ClientKey = tuple[int, str, str]
+
+
+class ClientKeyWindow:
+    """Recently used (thread_id, sender, client_key) -> message row.
+
+    `claim` reserves a key for the first sender and makes concurrent retries
+    of the same key wait for that attempt instead of inserting again. A
+    finished attempt stays in the window for `ttl_seconds`. Older retries fall
+    through to the unique index on chat_messages, which is the durable check
+    and the one that works across workers.
+    """
+
+    def __init__(self, ttl_seconds: float, max_keys: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.hits = 0
+        self._entries: OrderedDict[ClientKey, tuple[float, asyncio.Future]] = OrderedDict()
+
+    async def claim(self, key: ClientKey) -> Optional[dict]:
+        """Return the row already stored under `key`, or None once the caller owns it."""
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic() and entry[1].done():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                future = asyncio.get_running_loop().create_future()
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, future)
+                self._evict()
+                return None
+            row = await asyncio.shield(entry[1])
+            if row is not None:
+                self.hits += 1
+                return row
+            # The attempt we waited on failed and released the key; retry the claim.
+
+    def complete(self, key: ClientKey, row: dict) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, entry[1])
+        if not entry[1].done():
+            entry[1].set_result(row)
+
+    def release(self, key: ClientKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and not entry[1].done():
+            entry[1].set_result(None)
+
+    def stats(self) -> dict:
+        return {"keys": len(self._entries), "hits": self.hits}
+
+    def _evict(self) -> None:
+        # Keys still in flight have waiters and are never evicted.
+        while len(self._entries) > self.max_keys:
+            key, (_, future) = next(iter(self._entries.items()))
+            if not future.done():
+                break
+            del self._entries[key]
+
+
+client_keys = ClientKeyWindow(CHAT_CLIENT_KEY_TTL, CHAT_CLIENT_KEY_WINDOW)
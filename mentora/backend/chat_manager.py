@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from fastapi import WebSocket
+
+from chat_broker import create_broker
+from chat_codec import Frame, negotiate
+from chat_membership import membership_cache
+from chat_presence import PresenceTracker
+from config import CHAT_SEND_QUEUE_SIZE, CHAT_SLOW_CONSUMER_POLICY
+
+logger = logging.getLogger("mentora.chat")
+
+# WebSocket close code 1013: "try again later".
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class _Connection:
+    """One socket plus its codec, bounded outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int, codec) -> None:
+        self.websocket = websocket
+        self.codec = codec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+
+class ConnectionManager:
+    """Tracks the sockets held by this worker and fans events out via a broker.
+
+    `send_to` / `send_to_many` publish to the broker; the broker hands the
+    event to every worker, and each worker enqueues it on the outbound queue
+    of every local socket of the recipients. Each socket is drained by its
+    own writer task, so a slow client never delays anyone else. When a queue
+    is full the slow-consumer policy applies: "drop_oldest" discards the
+    oldest queued frame, "disconnect" closes the socket.
+    """
+
+    def __init__(
+        self,
+        broker,
+        max_queue: int = CHAT_SEND_QUEUE_SIZE,
+        slow_consumer_policy: str = CHAT_SLOW_CONSUMER_POLICY,
+    ) -> None:
+        if slow_consumer_policy not in {"drop_oldest", "disconnect"}:
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        self.active: dict[str, dict[WebSocket, _Connection]] = {}
+        self.max_queue = max_queue
+        self.slow_consumer_policy = slow_consumer_policy
+        self.counters = {
+            "enqueued": 0,
+            "sent": 0,
+            "dropped": 0,
+            "slow_disconnects": 0,
+            "send_errors": 0,
+        }
+        self.presence = PresenceTracker(self)
+        self._broker = broker
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self._broker.start(self._dispatch)
+                self.presence.start()
+                self._started = True
+
+    async def stop(self) -> None:
+        if self._started:
+            await self.presence.stop()
+            await self._broker.stop()
+            self._started = False
+
+    async def connect(self, username: str, websocket: WebSocket):
+        """Accept a socket with its negotiated codec and return that codec."""
+        await self.start()
+        codec, subprotocol = negotiate(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        conn = _Connection(websocket, self.max_queue, codec)
+        conn.writer = asyncio.create_task(self._write_loop(username, conn))
+        self.active.setdefault(username, {})[websocket] = conn
+        self.presence.touch(username)
+        return codec
+
+    def disconnect(self, username: str, websocket: WebSocket) -> None:
+        connections = self.active.get(username)
+        if not connections:
+            return
+        conn = connections.pop(websocket, None)
+        if not connections:
+            self.active.pop(username, None)
+        if conn is not None:
+            self.presence.disconnected(username, still_connected=bool(connections))
+        if conn and conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    async def send_to(self, username: str, payload: dict) -> None:
+        await self.send_to_many([username], payload)
+
+    async def send_to_many(self, usernames: Iterable[str], payload: dict) -> None:
+        recipients = sorted(set(usernames))
+        if not recipients:
+            return
+        await self.start()
+        await self._broker.publish(
+            {"kind": "deliver", "usernames": recipients, "payload": payload}
+        )
+
+    async def publish(self, event: dict) -> None:
+        await self.start()
+        await self._broker.publish(event)
+
+    async def membership_changed(self, thread_id: int) -> None:
+        """Drop cached participants for a thread on every worker."""
+        membership_cache.invalidate(thread_id)
+        await self.start()
+        await self._broker.publish({"kind": "members_changed", "thread_id": thread_id})
+
+    def reply(self, username: str, websocket: WebSocket, payload: dict) -> None:
+        """Queue a frame for one local socket (errors, acks) without the broker."""
+        conn = self.active.get(username, {}).get(websocket)
+        if conn is not None:
+            self._enqueue(username, conn, Frame(payload))
+
+    def stats(self) -> dict:
+        depths = [
+            conn.queue.qsize()
+            for connections in self.active.values()
+            for conn in connections.values()
+        ]
+        codecs: dict[str, int] = {}
+        for connections in self.active.values():
+            for conn in connections.values():
+                codecs[conn.codec.name] = codecs.get(conn.codec.name, 0) + 1
+        return {
+            **self.counters,
+            "users": len(self.active),
+            "connections": len(depths),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_capacity": self.max_queue,
+            "codecs": codecs,
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "membership_cache": membership_cache.stats(),
+            "presence": self.presence.stats(),
+        }
+
+    async def _dispatch(self, event: dict) -> None:
+        kind = event.get("kind")
+        if kind == "deliver":
+            frame = Frame(event["payload"])
+            for username in event.get("usernames", []):
+                for conn in list(self.active.get(username, {}).values()):
+                    self._enqueue(username, conn, frame)
+        elif kind == "members_changed":
+            membership_cache.invalidate(int(event["thread_id"]))
+        elif kind == "presence":
+            self.presence.apply(event.get("worker", ""), event.get("updates", {}))
+
+    def _enqueue(self, username: str, conn: _Connection, frame: Frame) -> None:
+        try:
+            conn.queue.put_nowait(frame)
+            self.counters["enqueued"] += 1
+            return
+        except asyncio.QueueFull:
+            pass
+
+        conn.dropped += 1
+        self.counters["dropped"] += 1
+        if self.slow_consumer_policy == "disconnect":
+            self.counters["slow_disconnects"] += 1
+            logger.info("Disconnecting slow chat consumer %s", username)
+            self.disconnect(username, conn.websocket)
+            asyncio.create_task(self._close(conn.websocket))
+            return
+
+        conn.queue.get_nowait()
+        conn.queue.put_nowait(frame)
+        self.counters["enqueued"] += 1
+
+    async def _write_loop(self, username: str, conn: _Connection) -> None:
+        try:
+            while True:
+                frame = await conn.queue.get()
+                data = frame.encode(conn.codec)
+                if conn.codec.binary:
+                    await conn.websocket.send_bytes(data)
+                else:
+                    await conn.websocket.send_text(data)
+                self.counters["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.counters["send_errors"] += 1
+            self.disconnect(username, conn.websocket)
+
+    @staticmethod
+    async def _close(websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+
+manager = ConnectionManager(create_broker())
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import CHAT_MEMBERSHIP_CACHE_SIZE, CHAT_MEMBERSHIP_CACHE_TTL
+
+
+class MembershipCache:
+    """LRU cache of thread_id -> participant usernames with a TTL.
+
+    Shared by the event loop and the DB thread pool, so every operation takes
+    a lock. Loads are versioned: a value read from the database is only stored
+    if the thread was not invalidated while the query was running, which keeps
+    a slow reader from re-inserting a membership list that was just changed.
+    """
+
+    def __init__(self, max_threads: int, ttl_seconds: float) -> None:
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[float, tuple[str, ...]]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: int) -> Optional[tuple[str, ...]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[thread_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(thread_id)
+            self.hits += 1
+            return entry[1]
+
+    def version(self, thread_id: int) -> int:
+        with self._lock:
+            return self._versions.get(thread_id, 0)
+
+    def put(self, thread_id: int, members: list[str], version: int) -> None:
+        with self._lock:
+            if self._versions.get(thread_id, 0) != version:
+                return
+            self._entries[thread_id] = (
+                time.monotonic() + self.ttl_seconds,
+                tuple(members),
+            )
+            self._entries.move_to_end(thread_id)
+            while len(self._entries) > self.max_threads:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, thread_id: int) -> None:
+        with self._lock:
+            self._entries.pop(thread_id, None)
+            self._versions[thread_id] = self._versions.get(thread_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+membership_cache = MembershipCache(CHAT_MEMBERSHIP_CACHE_SIZE, CHAT_MEMBERSHIP_CACHE_TTL)
@@ -0,0 +1,266 @@
+"""Presence (online/away/offline) and typing indicators, kept in memory.
+
+A user is online while they hold a socket on any worker. Clients can send
+{"type": "heartbeat", "status": "away"} to go away. Clients that send
+heartbeats also opt in to expiry: once they have sent one, CHAT_PRESENCE_TTL
+seconds without any frame takes the user offline even if the socket has
+not closed. Clients that never heartbeat stay online until they disconnect.
+
+Every worker publishes its users' changes through the broker, tagged with a
+worker id, and tracks which workers hold a socket for each user. A worker
+whose last local socket for a user closes only publishes that fact. The
+user goes offline, and friends are told, when that event leaves no worker
+holding them. Every worker sees broker events in the same order, so exactly
+one worker, the one whose event emptied the set, sends the offline frame.
+
+Typing state is {"type": "typing", "thread_id": N, "typing": bool}, and each
+entry expires after CHAT_TYPING_TTL seconds unless refreshed.
+
+Nothing goes out immediately. Changes are collected, and a ticker flushes
+them every CHAT_PRESENCE_INTERVAL_MS. That means at most one typing frame
+per thread per tick, listing everyone typing, however many users type or
+how often they refresh. Presence changes go to each user's friends once per
+tick. They are also published through the broker, so every worker's
+snapshot for the friends list stays current.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from config import CHAT_PRESENCE_INTERVAL_MS, CHAT_PRESENCE_TTL, CHAT_TYPING_TTL
+from database import run_in_db
+from models import Friend
+
+logger = logging.getLogger("mentora.chat")
+
+STATUSES = {"online", "away", "offline"}
+
+
+def friends_of(db: Session, usernames: Iterable[str]) -> dict[str, list[str]]:
+    usernames = list(usernames)
+    rows = (
+        db.query(Friend.user_a, Friend.user_b)
+        .filter(or_(Friend.user_a.in_(usernames), Friend.user_b.in_(usernames)))
+        .all()
+    )
+    wanted = set(usernames)
+    friends: dict[str, list[str]] = defaultdict(list)
+    for user_a, user_b in rows:
+        if user_a in wanted:
+            friends[user_a].append(user_b)
+        if user_b in wanted:
+            friends[user_b].append(user_a)
+    return friends
+
+
+class PresenceTracker:
+    def __init__(
+        self,
+        manager,
+        ttl_seconds: float = CHAT_PRESENCE_TTL,
+        typing_ttl_seconds: float = CHAT_TYPING_TTL,
+        interval_ms: int = CHAT_PRESENCE_INTERVAL_MS,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.typing_ttl_seconds = typing_ttl_seconds
+        self.interval = interval_ms / 1000
+        self.counters = {"presence_frames": 0, "typing_frames": 0, "typing_updates": 0}
+        self.worker_id = uuid.uuid4().hex
+        self._manager = manager
+        # Last frame of each user connected to this worker, and the ones
+        # whose clients send heartbeats (only they expire).
+        self._seen: dict[str, float] = {}
+        self._heartbeats: set[str] = set()
+        # Known state of every user, and the workers holding their sockets,
+        # from this worker and the broker.
+        self._states: dict[str, dict] = {}
+        self._holders: dict[str, set[str]] = {}
+        self._pending: dict[str, dict] = {}
+        self._quiet: set[str] = set()
+        # Offline changes confirmed by the broker, for the next flush.
+        self._announce: dict[str, dict] = {}
+        self._typing: dict[int, dict[str, float]] = {}
+        self._typing_recipients: dict[int, list[str]] = {}
+        self._typing_dirty: set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def touch(
+        self,
+        username: str,
+        status: Optional[str] = None,
+        heartbeat: bool = False,
+    ) -> None:
+        """Record a frame; `status` switches between online and away."""
+        joined = username not in self._seen
+        self._seen[username] = time.monotonic()
+        if heartbeat:
+            self._heartbeats.add(username)
+        current = self._states.get(username, {}).get("status", "offline")
+        if status is None:
+            status = "online" if current == "offline" else current
+        if status != current:
+            self._set(username, status)
+        elif joined:
+            # Already known in this state; only tell the other workers.
+            self._set(username, status, announce=False)
+
+    def disconnected(self, username: str, still_connected: bool) -> None:
+        if still_connected:
+            return
+        self._seen.pop(username, None)
+        self._heartbeats.discard(username)
+        self._set(username, "offline")
+        for thread_id, typing in self._typing.items():
+            if typing.pop(username, None) is not None:
+                self._typing_dirty.add(thread_id)
+
+    def typing(
+        self,
+        thread_id: int,
+        username: str,
+        is_typing: bool,
+        participants: list[str],
+    ) -> None:
+        self.counters["typing_updates"] += 1
+        typing = self._typing.setdefault(thread_id, {})
+        self._typing_recipients[thread_id] = participants
+        if is_typing:
+            if username not in typing:
+                self._typing_dirty.add(thread_id)
+            typing[username] = time.monotonic() + self.typing_ttl_seconds
+        elif typing.pop(username, None) is not None:
+            self._typing_dirty.add(thread_id)
+
+    def snapshot(self, usernames: Iterable[str]) -> list[dict]:
+        items = []
+        for username in usernames:
+            state = self._states.get(username, {})
+            items.append(
+                {
+                    "username": username,
+                    "status": state.get("status", "offline"),
+                    "last_seen": state.get("last_seen"),
+                }
+            )
+        return items
+
+    def apply(self, worker: str, updates: dict[str, dict]) -> None:
+        """State published by any worker (this one included) via the broker."""
+        for username, state in updates.items():
+            holders = self._holders.setdefault(username, set())
+            if state["status"] != "offline":
+                holders.add(worker)
+            else:
+                holders.discard(worker)
+                if holders:
+                    # Still connected through another worker.
+                    continue
+                del self._holders[username]
+                if worker == self.worker_id:
+                    self._announce[username] = state
+            self._states[username] = state
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "local_users": len(self._seen),
+            "heartbeat_users": len(self._heartbeats),
+            "known_users": len(self._states),
+            "typing_threads": sum(1 for typing in self._typing.values() if typing),
+        }
+
+    def _set(self, username: str, status: str, announce: bool = True) -> None:
+        state = {"status": status, "last_seen": datetime.utcnow().isoformat()}
+        if announce:
+            self._quiet.discard(username)
+        else:
+            self._quiet.add(username)
+        # Offline only takes effect in apply(), once no worker holds the user.
+        if status != "offline":
+            self._states[username] = state
+        self._pending[username] = state
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for username in list(self._heartbeats):
+            if now - self._seen.get(username, now) > self.ttl_seconds:
+                self.disconnected(username, still_connected=False)
+        for thread_id, typing in list(self._typing.items()):
+            for username, expires_at in list(typing.items()):
+                if expires_at < now:
+                    del typing[username]
+                    self._typing_dirty.add(thread_id)
+            if not typing and thread_id not in self._typing_dirty:
+                del self._typing[thread_id]
+                self._typing_recipients.pop(thread_id, None)
+
+    async def flush(self) -> None:
+        dirty, self._typing_dirty = self._typing_dirty, set()
+        for thread_id in dirty:
+            recipients = self._typing_recipients.get(thread_id, [])
+            users = sorted(self._typing.get(thread_id, {}))
+            self.counters["typing_frames"] += 1
+            await self._manager.send_to_many(
+                recipients,
+                {"type": "typing", "thread_id": thread_id, "users": users},
+            )
+
+        changes, self._announce = self._announce, {}
+        if self._pending:
+            updates, self._pending = self._pending, {}
+            quiet, self._quiet = self._quiet, set()
+            await self._manager.publish(
+                {"kind": "presence", "worker": self.worker_id, "updates": updates}
+            )
+            # Offline updates go out from apply() once the broker confirms them.
+            changes.update(
+                (username, state)
+                for username, state in updates.items()
+                if state["status"] != "offline" and username not in quiet
+            )
+            changes.update(self._announce)
+            self._announce = {}
+        if not changes:
+            return
+        friends = await run_in_db(friends_of, list(changes))
+        # One frame per distinct set of changed users, sent to all who share it.
+        by_recipient: dict[str, list[str]] = defaultdict(list)
+        for username in changes:
+            for friend in friends.get(username, []):
+                by_recipient[friend].append(username)
+        audiences: dict[tuple[str, ...], list[str]] = defaultdict(list)
+        for recipient, changed in by_recipient.items():
+            audiences[tuple(sorted(changed))].append(recipient)
+        for changed, recipients in audiences.items():
+            self.counters["presence_frames"] += 1
+            await self._manager.send_to_many(
+                recipients,
+                {"type": "presence", "users": {name: changes[name] for name in changed}},
+            )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self._expire()
+                await self.flush()
+            except Exception:
+                logger.exception("Presence flush failed")
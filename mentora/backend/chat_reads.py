@@ -0,0 +1,204 @@
+"""Read watermarks, unread counters and coalesced read receipts.
+
+Each ChatParticipant row keeps `last_read_message_id` (the watermark) and
+`unread_count`. Every new message increments `unread_count` for the other
+participants, and resets it for the sender, whose watermark moves to that
+message. The inbox reads the counters directly and never counts messages.
+
+Read receipts are buffered per thread for CHAT_READ_RECEIPT_INTERVAL_MS.
+Each reader's latest watermark is kept, so a burst of reads goes out as one
+"read" event per thread.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, bindparam, func, or_, update
+from sqlalchemy.orm import Session
+
+from chat_manager import manager
+from config import CHAT_READ_RECEIPT_INTERVAL_MS
+from models import ChatMessage, ChatParticipant, ChatThread
+
+_participants = ChatParticipant.__table__
+
+_increment_unread = (
+    update(_participants)
+    .where(
+        and_(
+            _participants.c.thread_id == bindparam("b_thread_id"),
+            _participants.c.username != bindparam("b_sender"),
+            or_(
+                _participants.c.last_read_message_id.is_(None),
+                _participants.c.last_read_message_id < bindparam("b_message_id"),
+            ),
+        )
+    )
+    .values(unread_count=_participants.c.unread_count + 1)
+)
+
+_sender_read_to = (
+    update(_participants)
+    .where(
+        and_(
+            _participants.c.thread_id == bindparam("b_thread_id"),
+            _participants.c.username == bindparam("b_sender"),
+            or_(
+                _participants.c.last_read_message_id.is_(None),
+                _participants.c.last_read_message_id < bindparam("b_message_id"),
+            ),
+        )
+    )
+    .values(
+        last_read_message_id=bindparam("b_message_id"),
+        unread_count=bindparam("b_unread"),
+    )
+)
+
+
+def record_sent(db: Session, rows: Iterable[dict]) -> None:
+    """Update counters for newly inserted messages, in the caller's transaction.
+
+    `rows` carry message_id, thread_id and sender. A batch from the
+    write-behind buffer is applied with two executemany statements.
+    """
+    rows = sorted(rows, key=lambda row: row["message_id"])
+    if not rows:
+        return
+    db.execute(
+        _increment_unread,
+        [
+            {
+                "b_thread_id": row["thread_id"],
+                "b_sender": row["sender"],
+                "b_message_id": row["message_id"],
+            }
+            for row in rows
+        ],
+    )
+    # A sender has read everything up to their own latest message; what is
+    # unread for them is what others posted after it in the same batch.
+    latest: dict[tuple[int, str], int] = {}
+    for row in rows:
+        latest[(row["thread_id"], row["sender"])] = row["message_id"]
+    db.execute(
+        _sender_read_to,
+        [
+            {
+                "b_thread_id": thread_id,
+                "b_sender": sender,
+                "b_message_id": message_id,
+                "b_unread": sum(
+                    1
+                    for row in rows
+                    if row["thread_id"] == thread_id
+                    and row["sender"] != sender
+                    and row["message_id"] > message_id
+                ),
+            }
+            for (thread_id, sender), message_id in latest.items()
+        ],
+    )
+
+
+def mark_read(
+    db: Session,
+    username: str,
+    thread_id: int,
+    message_id: Optional[int] = None,
+) -> Optional[dict]:
+    """Move `username`'s watermark forward and recompute their unread count.
+
+    `message_id` defaults to the thread's latest message. Returns the new
+    watermark and unread count, or None if the user is not a participant.
+    The watermark never moves backwards.
+    """
+    participant = (
+        db.query(ChatParticipant)
+        .filter(
+            ChatParticipant.thread_id == thread_id,
+            ChatParticipant.username == username,
+        )
+        .with_for_update()
+        .first()
+    )
+    if participant is None:
+        return None
+    last_message_id = (
+        db.query(ChatThread.last_message_id)
+        .filter(ChatThread.thread_id == thread_id)
+        .scalar()
+    )
+    if message_id is None or (last_message_id and message_id > last_message_id):
+        message_id = last_message_id
+    if message_id and (
+        participant.last_read_message_id is None
+        or message_id > participant.last_read_message_id
+    ):
+        participant.last_read_message_id = message_id
+        if last_message_id is None or message_id >= last_message_id:
+            participant.unread_count = 0
+        else:
+            # Reading part of the backlog: a range scan on (thread_id, message_id).
+            participant.unread_count = (
+                db.query(func.count(ChatMessage.message_id))
+                .filter(
+                    ChatMessage.thread_id == thread_id,
+                    ChatMessage.message_id > message_id,
+                    ChatMessage.sender != username,
+                )
+                .scalar()
+            )
+    result = {
+        "thread_id": thread_id,
+        "last_read_message_id": participant.last_read_message_id,
+        "unread_count": participant.unread_count,
+    }
+    db.commit()
+    return result
+
+
+class ReadReceipts:
+    """Buffers read receipts per thread and broadcasts them at most once per interval."""
+
+    def __init__(self, interval_ms: int) -> None:
+        self.interval = interval_ms / 1000
+        self.counters = {"queued": 0, "broadcasts": 0}
+        self._pending: dict[int, dict[str, int]] = {}
+        self._recipients: dict[int, list[str]] = {}
+        self._flushes: dict[int, asyncio.Task] = {}
+
+    def queue(
+        self,
+        thread_id: int,
+        username: str,
+        message_id: int,
+        participants: list[str],
+    ) -> None:
+        reads = self._pending.setdefault(thread_id, {})
+        reads[username] = max(message_id, reads.get(username, 0))
+        self._recipients[thread_id] = participants
+        self.counters["queued"] += 1
+        if thread_id not in self._flushes:
+            self._flushes[thread_id] = asyncio.create_task(self._flush_later(thread_id))
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending_threads": len(self._pending)}
+
+    async def _flush_later(self, thread_id: int) -> None:
+        try:
+            await asyncio.sleep(self.interval)
+        finally:
+            self._flushes.pop(thread_id, None)
+        reads = self._pending.pop(thread_id, None)
+        participants = self._recipients.pop(thread_id, [])
+        if reads:
+            self.counters["broadcasts"] += 1
+            await manager.send_to_many(
+                participants,
+                {"type": "read", "thread_id": thread_id, "reads": reads},
+            )
+
+
+read_receipts = ReadReceipts(CHAT_READ_RECEIPT_INTERVAL_MS)
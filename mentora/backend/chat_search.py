@@ -0,0 +1,205 @@
+"""Full-text search over chat messages.
+
+On Postgres, search uses the GIN index ix_chat_messages_content_fts on
+to_tsvector(CHAT_SEARCH_CONFIG, content). Postgres keeps that index current
+on every insert, ranks with ts_rank, and builds snippets with ts_headline.
+
+Other databases (SQLite in local runs and tests) use InvertedIndex. It is a
+portable in-process index, built from the table on first use and then kept
+current through `index_message` and `remove_thread`. It is per process and
+does not coordinate with other workers.
+"""
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session
+
+from config import CHAT_SEARCH_CONFIG
+from models import ChatMessage, ChatParticipant
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+SNIPPET_RADIUS = 40
+
+
+def tokenize(text: str) -> list[str]:
+    return [token.casefold() for token in TOKEN_RE.findall(text or "")]
+
+
+def _snippet(content: str, terms: set[str]) -> str:
+    lowered = content.casefold()
+    positions = [lowered.find(term) for term in terms if term in lowered]
+    if not positions:
+        return content[: SNIPPET_RADIUS * 2]
+    at = min(positions)
+    start = max(0, at - SNIPPET_RADIUS)
+    end = min(len(content), at + SNIPPET_RADIUS)
+    return ("…" if start else "") + content[start:end] + ("…" if end < len(content) else "")
+
+
+class InvertedIndex:
+    """term -> {message_id: term frequency}, plus the stored rows for results."""
+
+    def __init__(self) -> None:
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._docs: dict[int, dict] = {}
+        self._threads: dict[int, set[int]] = defaultdict(set)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded:
+            return
+        rows = db.query(ChatMessage).order_by(ChatMessage.message_id.asc()).all()
+        with self._lock:
+            if self._loaded:
+                return
+            for message in rows:
+                self._add(
+                    {
+                        "message_id": message.message_id,
+                        "thread_id": message.thread_id,
+                        "sender": message.sender,
+                        "content": message.content,
+                        "created_at": message.created_at,
+                    }
+                )
+            self._loaded = True
+
+    def add(self, row: dict) -> None:
+        with self._lock:
+            if self._loaded:
+                self._add(row)
+
+    def remove_thread(self, thread_id: int) -> None:
+        with self._lock:
+            for message_id in self._threads.pop(thread_id, set()):
+                row = self._docs.pop(message_id, None)
+                if not row:
+                    continue
+                for term in set(tokenize(row["content"])):
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.pop(message_id, None)
+                        if not postings:
+                            del self._postings[term]
+
+    def search(
+        self,
+        query: str,
+        thread_ids: set[int],
+        limit: int,
+        offset: int,
+    ) -> list[dict]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            total = max(1, len(self._docs))
+            scores: dict[int, float] = defaultdict(float)
+            matched: dict[int, int] = defaultdict(int)
+            for term in terms:
+                postings = self._postings.get(term, {})
+                idf = math.log(1 + total / (1 + len(postings)))
+                for message_id, tf in postings.items():
+                    if self._docs[message_id]["thread_id"] in thread_ids:
+                        scores[message_id] += tf * idf
+                        matched[message_id] += 1
+            # Every term must match, like plainto_tsquery.
+            hits = [mid for mid in scores if matched[mid] == len(terms)]
+            hits.sort(key=lambda mid: (scores[mid], mid), reverse=True)
+            return [
+                {
+                    **self._docs[mid],
+                    "rank": round(scores[mid], 6),
+                    "snippet": _snippet(self._docs[mid]["content"], terms),
+                }
+                for mid in hits[offset : offset + limit]
+            ]
+
+    def _add(self, row: dict) -> None:
+        message_id = row["message_id"]
+        if message_id in self._docs:
+            return
+        self._docs[message_id] = dict(row)
+        self._threads[row["thread_id"]].add(message_id)
+        counts: dict[str, int] = defaultdict(int)
+        for term in tokenize(row["content"]):
+            counts[term] += 1
+        for term, count in counts.items():
+            self._postings[term][message_id] = count
+
+
+fallback_index = InvertedIndex()
+
+
+def index_message(row: dict) -> None:
+    """Hook for every new message; Postgres maintains its own index."""
+    fallback_index.add(row)
+
+
+def remove_thread(thread_id: int) -> None:
+    fallback_index.remove_thread(thread_id)
+
+
+def _search_postgres(
+    db: Session,
+    username: str,
+    query: str,
+    limit: int,
+    offset: int,
+) -> list[dict]:
+    config = literal_column(f"'{CHAT_SEARCH_CONFIG}'::regconfig")
+    document = func.to_tsvector(config, ChatMessage.content)
+    ts_query = func.plainto_tsquery(config, query)
+    rank = func.ts_rank(document, ts_query).label("rank")
+    snippet = func.ts_headline(
+        config,
+        ChatMessage.content,
+        ts_query,
+        "MaxFragments=1, MaxWords=16, MinWords=6, StartSel=**, StopSel=**",
+    ).label("snippet")
+    rows = (
+        db.query(ChatMessage, rank, snippet)
+        .join(ChatParticipant, ChatParticipant.thread_id == ChatMessage.thread_id)
+        .filter(ChatParticipant.username == username, document.op("@@")(ts_query))
+        .order_by(rank.desc(), ChatMessage.message_id.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "message_id": message.message_id,
+            "thread_id": message.thread_id,
+            "sender": message.sender,
+            "content": message.content,
+            "created_at": message.created_at,
+            "rank": float(rank_value),
+            "snippet": snippet_value,
+        }
+        for message, rank_value, snippet_value in rows
+    ]
+
+
+def search_messages(
+    db: Session,
+    username: str,
+    query: str,
+    limit: int,
+    offset: int,
+) -> list[dict]:
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, username, query, limit, offset)
+    fallback_index.ensure_loaded(db)
+    thread_ids = {
+        row.thread_id
+        for row in db.query(ChatParticipant.thread_id)
+        .filter(ChatParticipant.username == username)
+        .all()
+    }
+    return fallback_index.search(query, thread_ids, limit, offset)
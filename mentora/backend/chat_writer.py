@@ -0,0 +1,226 @@
+"""Write-behind buffer for chat messages.
+
+When CHAT_WRITE_BEHIND is enabled, every message goes through this writer,
+REST sends included. Ids come from the chat_messages sequence in blocks,
+one round trip per block rather than per message. The block size follows
+recent traffic (1 to CHAT_FLUSH_MAX_BATCH ids), and ids left unused
+CHAT_FLUSH_INTERVAL_MS after the block was drawn are discarded. So across
+workers message_id follows send order to within one flush interval, which
+the sync overlap (CHAT_SYNC_OVERLAP_MS) covers.
+The message is broadcast right away and appended to an in-memory buffer.
+The buffer is flushed as one multi-row INSERT, plus the inbox column and
+unread counter updates, in a single transaction. A flush happens whenever
+CHAT_FLUSH_MAX_BATCH messages are pending or CHAT_FLUSH_INTERVAL_MS has
+passed since the first pending message.
+
+Durability: a WebSocket message is acknowledged to clients before it is
+committed. If the process crashes, the unflushed buffer is lost. That is
+at most CHAT_FLUSH_MAX_BATCH messages or CHAT_FLUSH_INTERVAL_MS worth of
+traffic per worker. REST sends wait for the flush that writes them. A
+failed flush is retried with its rows kept in order. If a batch violates a
+constraint, its rows are written one at a time and the offending rows are
+logged and dropped. A graceful shutdown flushes everything pending. Leave
+the mode off where every acknowledged message must already be on disk.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, bindparam, func, insert, or_, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from chat_reads import record_sent
+from config import CHAT_FLUSH_INTERVAL_MS, CHAT_FLUSH_MAX_BATCH
+from database import engine, run_in_db
+from models import ChatMessage, ChatThread
+
+logger = logging.getLogger("mentora.chat")
+
+FLUSH_RETRY_SECONDS = 1.0
+
+
+def _sequence_ids(db: Session, count: int) -> list[int]:
+    return db.execute(
+        text(
+            "SELECT nextval(pg_get_serial_sequence('chat_messages', 'message_id')) "
+            "FROM generate_series(1, :count)"
+        ),
+        {"count": count},
+    ).scalars().all()
+
+
+def _max_id(db: Session) -> int:
+    return db.query(func.max(ChatMessage.message_id)).scalar() or 0
+
+
+_threads = ChatThread.__table__
+_advance_last_message = (
+    update(_threads)
+    .where(
+        and_(
+            _threads.c.thread_id == bindparam("b_thread_id"),
+            or_(
+                _threads.c.last_message_id.is_(None),
+                _threads.c.last_message_id < bindparam("b_message_id"),
+            ),
+        )
+    )
+    .values(
+        last_message_id=bindparam("b_message_id"),
+        last_message_at=bindparam("b_created_at"),
+        updated_at=bindparam("b_created_at"),
+    )
+)
+
+
+def _write_batch(db: Session, rows: list[dict]) -> None:
+    _write_batch_rows(db, rows)
+    db.commit()
+
+
+def _write_batch_rows(db: Session, rows: list[dict]) -> None:
+    db.execute(insert(ChatMessage), rows)
+    latest: dict[int, dict] = {}
+    for row in rows:
+        current = latest.get(row["thread_id"])
+        if current is None or row["message_id"] > current["message_id"]:
+            latest[row["thread_id"]] = row
+    db.execute(
+        _advance_last_message,
+        [
+            {
+                "b_thread_id": row["thread_id"],
+                "b_message_id": row["message_id"],
+                "b_created_at": row["created_at"],
+            }
+            for row in latest.values()
+        ],
+    )
+    record_sent(db, rows)
+
+
+def _write_rows_individually(db: Session, rows: list[dict]) -> None:
+    """Fallback for a batch that hit a constraint: keep every row that fits."""
+    for row in rows:
+        try:
+            with db.begin_nested():
+                _write_batch_rows(db, [row])
+        except IntegrityError:
+            logger.error("Dropping chat message %s: %s", row["message_id"], row)
+    db.commit()
+
+
+class MessageWriter:
+    def __init__(self, max_batch: int, interval_ms: int) -> None:
+        self.max_batch = max_batch
+        self.interval = interval_ms / 1000
+        self.counters = {
+            "buffered": 0,
+            "flushed": 0,
+            "batches": 0,
+            "flush_errors": 0,
+            "id_blocks": 0,
+        }
+        self._pending: list[dict] = []
+        # Postgres: the current block of ids, when it was drawn and how many
+        # of the previous block were used (the next block's size).
+        self._ids: list[int] = []
+        self._ids_drawn = 0.0
+        self._ids_wanted = 0
+        # Databases without a shareable sequence count ids in this process.
+        self._last_id: Optional[int] = None
+        self._id_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(
+        self,
+        thread_id: int,
+        sender: str,
+        content: str,
+        client_key: Optional[str] = None,
+        durable: bool = False,
+    ) -> dict:
+        """Buffer a message and return its row, id and created_at included.
+
+        With `durable` the call returns once the row is committed.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        row = {
+            "message_id": await self._next_id(),
+            "thread_id": thread_id,
+            "sender": sender,
+            "content": content,
+            "created_at": datetime.utcnow(),
+            "client_key": client_key,
+        }
+        self._pending.append(row)
+        self.counters["buffered"] += 1
+        if durable:
+            await self.flush()
+        elif len(self._pending) >= self.max_batch or len(self._pending) == 1:
+            self._wakeup.set()
+        return row
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[: self.max_batch]
+                try:
+                    await run_in_db(_write_batch, batch)
+                except IntegrityError:
+                    await run_in_db(_write_rows_individually, batch)
+                del self._pending[: len(batch)]
+                self.counters["flushed"] += len(batch)
+                self.counters["batches"] += 1
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": len(self._pending)}
+
+    async def _next_id(self) -> int:
+        if engine.dialect.name == "postgresql":
+            async with self._id_lock:
+                now = time.monotonic()
+                if not self._ids or now - self._ids_drawn > self.interval:
+                    used = self._ids_wanted - len(self._ids)
+                    self._ids_wanted = max(1, min(self.max_batch, 2 * used))
+                    self._ids = await run_in_db(_sequence_ids, self._ids_wanted)
+                    self.counters["id_blocks"] += 1
+                    self._ids_drawn = time.monotonic()
+                return self._ids.pop(0)
+        # Only safe with a single worker, which is all SQLite setups run.
+        async with self._id_lock:
+            if self._last_id is None:
+                self._last_id = await run_in_db(_max_id)
+            self._last_id += 1
+            return self._last_id
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.counters["flush_errors"] += 1
+                logger.exception("Chat write-behind flush failed; retrying")
+                await asyncio.sleep(FLUSH_RETRY_SECONDS)
+                self._wakeup.set()
+
+
+message_writer = MessageWriter(CHAT_FLUSH_MAX_BATCH, CHAT_FLUSH_INTERVAL_MS)
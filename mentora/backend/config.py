@@ -13,3 +13,40 @@ JWT_EXPIRATION_HOURS = int(os.getenv("JWT_EXPIRATION_HOURS", "24"))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Chat fan-out: "memory" for a single worker, "postgres" for LISTEN/NOTIFY across workers
+CHAT_BROKER = os.getenv("CHAT_BROKER", "memory")
+CHAT_BROKER_CHANNEL = os.getenv("CHAT_BROKER_CHANNEL", "mentora_chat")
+# Per-socket outbound queue; slow consumers are handled by "drop_oldest" or "disconnect"
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "256"))
+CHAT_SLOW_CONSUMER_POLICY = os.getenv("CHAT_SLOW_CONSUMER_POLICY", "drop_oldest")
+# Threads used to run blocking DB work for async handlers; keep <= the engine pool size
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+# In-memory thread membership cache used by chat participant checks and fan-out
+CHAT_MEMBERSHIP_CACHE_SIZE = int(os.getenv("CHAT_MEMBERSHIP_CACHE_SIZE", "10000"))
+CHAT_MEMBERSHIP_CACHE_TTL = float(os.getenv("CHAT_MEMBERSHIP_CACHE_TTL", "60"))
+# Optional write-behind for WebSocket chat messages (see chat_writer.py for durability)
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "0") == "1"
+CHAT_FLUSH_MAX_BATCH = int(os.getenv("CHAT_FLUSH_MAX_BATCH", "100"))
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "50"))
+# Sync cursors trail the newest message by this much so late commits of lower ids are replayed
+CHAT_SYNC_OVERLAP_MS = int(os.getenv("CHAT_SYNC_OVERLAP_MS", "5000"))
+# Text search configuration for chat search on Postgres ("simple" does no stemming, so it suits mixed languages)
+CHAT_SEARCH_CONFIG = os.getenv("CHAT_SEARCH_CONFIG", "simple")
+# Read receipts are coalesced per thread and broadcast at most once per interval
+CHAT_READ_RECEIPT_INTERVAL_MS = int(os.getenv("CHAT_READ_RECEIPT_INTERVAL_MS", "250"))
+# Presence/typing: expiry for clients that heartbeat, typing expiry (seconds), coalescing tick
+CHAT_PRESENCE_TTL = float(os.getenv("CHAT_PRESENCE_TTL", "60"))
+CHAT_TYPING_TTL = float(os.getenv("CHAT_TYPING_TTL", "6"))
+CHAT_PRESENCE_INTERVAL_MS = int(os.getenv("CHAT_PRESENCE_INTERVAL_MS", "500"))
+# Window in which a retried send with the same client_key returns the original message
+CHAT_CLIENT_KEY_TTL = float(os.getenv("CHAT_CLIENT_KEY_TTL", "300"))
+CHAT_CLIENT_KEY_WINDOW = int(os.getenv("CHAT_CLIENT_KEY_WINDOW", "50000"))
+# Messages older than this many days are moved to the compressed archive by jobs/archive_chat_messages.py
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "180"))
+
+# Phase 4 engine for the local scheduler: "optimal" or "random" (baseline).
+SCHEDULER_PLACER = os.getenv("SCHEDULER_PLACER", "optimal")
+SCHEDULER_TIME_BUDGET_MS = float(os.getenv("SCHEDULER_TIME_BUDGET_MS", "200"))
+# How long a token from POST /scheduler/{username}/preview can be committed
+SCHEDULER_PREVIEW_TTL_MINUTES = int(os.getenv("SCHEDULER_PREVIEW_TTL_MINUTES", "30"))
@@ -1,7 +1,34 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from config import DATABASE_URL
+from config import DATABASE_URL, DB_EXECUTOR_WORKERS
 
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+T = TypeVar("T")
+
+# Dedicated threads for blocking DB work issued from async code (WebSockets),
+# so a slow query or commit never stalls the event loop.
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    thread_name_prefix="db",
+)
+
+
+def _call_with_session(fn: Callable[..., T], args: tuple) -> T:
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_in_db(fn: Callable[..., T], *args: Any) -> T:
+    """Run `fn(db, *args)` on the DB thread pool with its own session."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, _call_with_session, fn, args)
@@ -0,0 +1,67 @@
+"""Move chat messages older than a cutoff into the compressed archive.
+
+Run from mentora/backend, e.g. nightly:
+
+    python -m jobs.archive_chat_messages [--older-than-days 180] [--chunk-size 500]
+
+Each thread is archived in chunks of at most --chunk-size messages, split by
+month. Every chunk's archive rows and hot-table delete commit together, so
+the job can be interrupted and re-run at any time. Each thread's latest
+message stays in chat_messages for the inbox.
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from chat_archive import archive_thread
+from config import CHAT_ARCHIVE_AFTER_DAYS
+from database import SessionLocal, engine
+from models import ChatMessage, ChatMessageArchive
+
+logger = logging.getLogger("mentora.jobs")
+
+
+def archive(db: Session, older_than_days: int, chunk_size: int = 500) -> int:
+    """Archive every thread's old messages; returns the number moved."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    thread_ids = [
+        row.thread_id
+        for row in db.query(ChatMessage.thread_id)
+        .filter(ChatMessage.created_at < cutoff)
+        .distinct()
+        .all()
+    ]
+    moved = 0
+    for thread_id in thread_ids:
+        count = archive_thread(db, thread_id, cutoff, chunk_size)
+        if count:
+            logger.info("archived %d messages from thread %d", count, thread_id)
+        moved += count
+    logger.info(
+        "archive_chat_messages: %d messages from %d threads older than %s",
+        moved,
+        len(thread_ids),
+        cutoff.isoformat(),
+    )
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--older-than-days", type=int, default=CHAT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ChatMessageArchive.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        archive(db, args.older_than_days, args.chunk_size)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Backfill ChatParticipant rows for legacy threads that only have user_a/user_b.
+
+Run from mentora/backend:
+
+    python -m jobs.backfill_chat_participants [--batch-size 500] [--force]
+
+Threads are processed in thread_id order, one transaction per chunk. The
+cursor is stored in `maintenance_jobs`, so an interrupted run resumes where
+it stopped. Once the job has completed it is a no-op unless --force is given.
+"""
+import argparse
+import logging
+from datetime import datetime
+
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import ChatParticipant, ChatThread, MaintenanceJob
+
+JOB_NAME = "backfill_chat_participants"
+
+logger = logging.getLogger("mentora.jobs")
+
+
+def _job_state(db: Session, force: bool) -> MaintenanceJob:
+    state = db.get(MaintenanceJob, JOB_NAME)
+    if state is None:
+        state = MaintenanceJob(job_name=JOB_NAME, cursor=0, processed=0)
+        db.add(state)
+        db.commit()
+    elif force:
+        state.cursor = 0
+        state.processed = 0
+        state.started_at = datetime.utcnow()
+        state.completed_at = None
+        db.commit()
+    return state
+
+
+def backfill(db: Session, batch_size: int = 500, force: bool = False) -> int:
+    """Insert missing participant rows; returns the number of threads fixed."""
+    state = _job_state(db, force)
+    if state.completed_at is not None:
+        logger.info("%s already completed at %s", JOB_NAME, state.completed_at)
+        return 0
+
+    fixed = 0
+    while True:
+        threads = (
+            db.query(ChatThread.thread_id, ChatThread.user_a, ChatThread.user_b)
+            .filter(ChatThread.thread_id > state.cursor)
+            .order_by(ChatThread.thread_id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not threads:
+            break
+
+        has_participants = exists().where(
+            ChatParticipant.thread_id == ChatThread.thread_id
+        )
+        missing = {
+            row.thread_id
+            for row in db.query(ChatThread.thread_id)
+            .filter(
+                ChatThread.thread_id.in_([t.thread_id for t in threads]),
+                ~has_participants,
+            )
+            .all()
+        }
+        for thread in threads:
+            if thread.thread_id not in missing:
+                continue
+            db.add_all(
+                [
+                    ChatParticipant(thread_id=thread.thread_id, username=username)
+                    for username in sorted({thread.user_a, thread.user_b})
+                ]
+            )
+
+        fixed += len(missing)
+        state.cursor = threads[-1].thread_id
+        state.processed += len(threads)
+        db.commit()
+        logger.info(
+            "%s: cursor=%d processed=%d fixed=%d",
+            JOB_NAME,
+            state.cursor,
+            state.processed,
+            fixed,
+        )
+
+    state.completed_at = datetime.utcnow()
+    db.commit()
+    logger.info("%s completed; %d threads backfilled", JOB_NAME, fixed)
+    return fixed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--force", action="store_true", help="restart from the beginning")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    MaintenanceJob.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        backfill(db, batch_size=args.batch_size, force=args.force)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Fill Course.ects for courses written before the column existed.
+
+Run from mentora/backend once after deploying the column:
+
+    python -m jobs.backfill_course_ects [--batch-size 1000] [--all]
+
+Courses are read in course_id order, --batch-size at a time. Each batch's
+values are written with one executemany UPDATE and committed, so the job
+can be interrupted and re-run. By default only rows with ects IS NULL are
+touched; --all re-parses every course, e.g. after extract_ects changes.
+"""
+import argparse
+import logging
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Course
+from schedule_planner import extract_ects
+
+logger = logging.getLogger("mentora.jobs")
+
+
+def backfill(db: Session, batch_size: int = 1000, everything: bool = False) -> int:
+    """Parse and store ECTS for each course; returns the number of rows updated."""
+    last_id = 0
+    updated = 0
+    while True:
+        query = (
+            select(Course.course_id, Course.description)
+            .where(Course.course_id > last_id)
+            .order_by(Course.course_id)
+            .limit(batch_size)
+        )
+        if not everything:
+            query = query.where(Course.ects.is_(None))
+        rows = db.execute(query).all()
+        if not rows:
+            break
+        db.execute(
+            update(Course),
+            [{"course_id": course_id, "ects": extract_ects(description)} for course_id, description in rows],
+        )
+        db.commit()
+        last_id = rows[-1].course_id
+        updated += len(rows)
+        logger.info("backfill_course_ects: %d courses up to id %d", updated, last_id)
+    logger.info("backfill_course_ects: updated %d courses", updated)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="re-parse courses that already have a value")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        backfill(db, args.batch_size, args.all)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
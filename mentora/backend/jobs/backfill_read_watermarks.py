@@ -0,0 +1,112 @@
+"""Mark chat history from before read tracking as read, once.
+
+Run from mentora/backend once after deploying the read watermark columns:
+
+    python -m jobs.backfill_read_watermarks [--batch-size 1000] [--force]
+
+Participants are processed in participant_id order, one transaction per
+batch. Each one whose watermark is still NULL gets its thread's latest
+message as watermark and an unread count of 0. The cursor is stored in
+`maintenance_jobs`, so an interrupted run resumes where it stopped. Once
+the job has completed it is a no-op unless --force is given, so
+participants added later, who have not read anything yet, keep their
+NULL watermark and unread counts.
+"""
+import argparse
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import ChatParticipant, ChatThread, MaintenanceJob
+
+JOB_NAME = "backfill_read_watermarks"
+
+logger = logging.getLogger("mentora.jobs")
+
+
+def _job_state(db: Session, force: bool) -> MaintenanceJob:
+    state = db.get(MaintenanceJob, JOB_NAME)
+    if state is None:
+        state = MaintenanceJob(job_name=JOB_NAME, cursor=0, processed=0)
+        db.add(state)
+        db.commit()
+    elif force:
+        state.cursor = 0
+        state.processed = 0
+        state.started_at = datetime.utcnow()
+        state.completed_at = None
+        db.commit()
+    return state
+
+
+def backfill(db: Session, batch_size: int = 1000, force: bool = False) -> int:
+    """Set missing watermarks; returns the number of participants updated."""
+    state = _job_state(db, force)
+    if state.completed_at is not None:
+        logger.info("%s already completed at %s", JOB_NAME, state.completed_at)
+        return 0
+
+    last_message_id = (
+        select(ChatThread.last_message_id)
+        .where(ChatThread.thread_id == ChatParticipant.thread_id)
+        .scalar_subquery()
+    )
+    updated = 0
+    while True:
+        ids = db.execute(
+            select(ChatParticipant.participant_id)
+            .where(ChatParticipant.participant_id > state.cursor)
+            .order_by(ChatParticipant.participant_id.asc())
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        result = db.execute(
+            update(ChatParticipant)
+            .where(
+                ChatParticipant.participant_id.in_(ids),
+                ChatParticipant.last_read_message_id.is_(None),
+                last_message_id.is_not(None),
+            )
+            .values(last_read_message_id=last_message_id, unread_count=0)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+        state.cursor = ids[-1]
+        state.processed += len(ids)
+        db.commit()
+        logger.info(
+            "%s: cursor=%d processed=%d updated=%d",
+            JOB_NAME,
+            state.cursor,
+            state.processed,
+            updated,
+        )
+
+    state.completed_at = datetime.utcnow()
+    db.commit()
+    logger.info("%s completed; %d watermarks set", JOB_NAME, updated)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--force", action="store_true", help="restart from the beginning")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    MaintenanceJob.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        backfill(db, batch_size=args.batch_size, force=args.force)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Plan next week's study sessions for every user with courses.
+
+Run from mentora/backend, e.g. on Sunday evening:
+
+    python -m jobs.plan_schedules [--workers 4] [--chunk-size 200]
+        [--placer optimal|random] [--force]
+
+Users are handled in chunks of --chunk-size. For each chunk, planner
+inputs are loaded with a handful of bulk queries (schedule_store). Users
+whose stored run still matches their inputs are skipped unless --force is
+given. The rest are planned in a process pool, and their new weeks are
+written in one transaction per chunk: one DELETE, one INSERT ... RETURNING
+for all sessions and the run rows. A failed chunk is rolled back and
+logged, and the job moves on.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from sqlalchemy import select
+
+from config import SCHEDULER_PLACER, SCHEDULER_TIME_BUDGET_MS
+from database import SessionLocal
+from models import Course
+from schedule_planner import PLACERS, make_placer, plan_week, upcoming_monday
+from schedule_store import current_runs, input_hash, intact_runs, load_schedule_inputs, replace_plans
+
+logger = logging.getLogger("mentora.jobs")
+
+
+def _plan_one(job: tuple) -> tuple[str, list, str]:
+    """Worker: (username, week_start, inputs, placer, budget) -> (username, sessions, error)."""
+    username, week_start, inputs, placer, time_budget_ms = job
+    try:
+        plan = plan_week(
+            week_start,
+            inputs["courses"],
+            inputs["availability"],
+            inputs["personality_scores"],
+            inputs["emotion_scores"],
+            make_placer(placer, time_budget_ms),
+        )
+    except ValueError as e:
+        return username, [], str(e)
+    return username, plan["sessions"], ""
+
+
+def plan_all(
+    workers: int,
+    chunk_size: int,
+    placer: str,
+    time_budget_ms: float,
+    force: bool = False,
+) -> dict:
+    today = date.today()
+    week_start = upcoming_monday(today)
+    totals = {"users": 0, "planned": 0, "unchanged": 0, "failed": 0, "sessions": 0}
+    timings = {"load": 0.0, "plan": 0.0, "write": 0.0}
+    started = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        usernames = db.scalars(select(Course.username).distinct().order_by(Course.username)).all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i in range(0, len(usernames), chunk_size):
+                chunk = usernames[i : i + chunk_size]
+                t0 = time.perf_counter()
+                inputs = load_schedule_inputs(db, chunk, today)
+                runs = current_runs(db, list(inputs), week_start)
+                intact = intact_runs(db, list(runs.values()))
+                hashes = {name: input_hash(data, week_start, placer) for name, data in inputs.items()}
+                todo = [
+                    name
+                    for name in inputs
+                    if force
+                    or name not in runs
+                    or runs[name].input_hash != hashes[name]
+                    or runs[name].run_id not in intact
+                ]
+                totals["users"] += len(inputs)
+                totals["unchanged"] += len(inputs) - len(todo)
+                t1 = time.perf_counter()
+
+                jobs = [(name, week_start, inputs[name], placer, time_budget_ms) for name in todo]
+                plans = []
+                for name, sessions, error in pool.map(
+                    _plan_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))
+                ):
+                    if error:
+                        logger.warning("plan_schedules: skipping %s: %s", name, error)
+                        totals["failed"] += 1
+                        continue
+                    plans.append(
+                        {
+                            "username": name,
+                            "run": runs.get(name),
+                            "input_hash": hashes[name],
+                            "placer": placer,
+                            "sessions": sessions,
+                        }
+                    )
+                t2 = time.perf_counter()
+
+                try:
+                    rows = replace_plans(db, week_start, plans)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    logger.exception("plan_schedules: chunk starting at %s failed", chunk[0])
+                    totals["failed"] += len(plans)
+                else:
+                    totals["planned"] += len(plans)
+                    totals["sessions"] += len(rows)
+                db.expunge_all()
+                t3 = time.perf_counter()
+                timings["load"] += t1 - t0
+                timings["plan"] += t2 - t1
+                timings["write"] += t3 - t2
+                logger.info(
+                    "plan_schedules: %d/%d users, %.1f users/s",
+                    min(i + chunk_size, len(usernames)),
+                    len(usernames),
+                    totals["users"] / (t3 - started),
+                )
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "plan_schedules: week of %s, %d users (%d planned, %d unchanged, %d failed), "
+        "%d sessions in %.1fs = %.1f users/s (load %.1fs, plan %.1fs, write %.1fs)",
+        week_start,
+        totals["users"],
+        totals["planned"],
+        totals["unchanged"],
+        totals["failed"],
+        totals["sessions"],
+        elapsed,
+        totals["users"] / elapsed if elapsed else 0.0,
+        timings["load"],
+        timings["plan"],
+        timings["write"],
+    )
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=None, help="default: CPU count")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--placer", choices=sorted(PLACERS), default=SCHEDULER_PLACER)
+    parser.add_argument("--time-budget-ms", type=float, default=SCHEDULER_TIME_BUDGET_MS)
+    parser.add_argument("--force", action="store_true", help="replan users whose inputs are unchanged")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    plan_all(args.workers or os.cpu_count() or 1, args.chunk_size, args.placer, args.time_budget_ms, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Purge the history of chat threads that were deleted but not yet purged.
+
+Run from mentora/backend, e.g. nightly:
+
+    python -m jobs.purge_deleted_threads [--batch-size 5000]
+
+Deleting a thread or group only marks it deleted; a background task then
+purges its messages, archive chunks and thread row. This job finishes any
+thread whose purge did not complete, for example because the process
+stopped. Each batch commits on its own, so it can be re-run at any time.
+"""
+import argparse
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from chat_archive import purge_thread
+from database import SessionLocal
+from models import ChatThread
+
+logger = logging.getLogger("mentora.jobs")
+
+
+def purge(db: Session, batch_size: int = 5000) -> int:
+    """Purge every thread marked deleted; returns the number of threads."""
+    thread_ids = db.execute(
+        select(ChatThread.thread_id)
+        .where(ChatThread.deleted_at.is_not(None))
+        .order_by(ChatThread.thread_id)
+    ).scalars().all()
+    for thread_id in thread_ids:
+        count = purge_thread(db, thread_id, batch_size)
+        logger.info("purged thread %d (%d messages)", thread_id, count)
+    logger.info("purge_deleted_threads: %d threads", len(thread_ids))
+    return len(thread_ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        purge(db, args.batch_size)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
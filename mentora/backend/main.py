@@ -1,7 +1,11 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
+from chat_manager import manager
+from chat_writer import message_writer
 from database import engine
 from routers.auth_router import router as auth_router
 from routers.chat_router import router as chat_router
@@ -14,13 +18,25 @@ from routers.emotion_router import router as emotion_router
 from routers.study_sessions_router import router as study_sessions_router
 from routers.daily_question_router import router as daily_question_router
 from routers.scheduler import router as scheduler_router
+from schema_updates import apply_schema_updates
 import models
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
+apply_schema_updates(engine)
 
 logging.basicConfig(level=logging.INFO)
-app = FastAPI(title="Mentora API")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Flush buffered chat messages before the worker exits.
+    await message_writer.stop()
+    await manager.stop()
+
+
+app = FastAPI(title="Mentora API", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -10,6 +10,9 @@ from sqlalchemy import (
     ForeignKey,
     Text,
     Boolean,
+    Index,
+    LargeBinary,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import (
@@ -19,6 +22,8 @@ from sqlalchemy.orm import (
     relationship,
 )
 
+from config import CHAT_SEARCH_CONFIG
+
 
 class Base(DeclarativeBase):
     pass
@@ -97,6 +102,40 @@ class StudySession(Base):
         nullable=False,
         default=datetime.utcnow,
     )
+    # Set on sessions planned by the scheduler; see ScheduleRun.
+    schedule_run_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("schedule_runs.run_id"),
+        nullable=True,
+    )
+
+    __table_args__ = (Index("ix_study_sessions_schedule_run", "schedule_run_id"),)
+
+
+class ScheduleRun(Base):
+    """The current generated plan for one user and week.
+
+    `input_hash` covers every input of the plan (see
+    schedule_planner.schedule_input_hash), so an unchanged request returns
+    the stored sessions instead of planning again.
+    """
+
+    __tablename__ = "schedule_runs"
+
+    run_id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(String(50), nullable=False)
+    week_start: Mapped[date] = mapped_column(Date, nullable=False)
+    input_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    placer: Mapped[Optional[str]] = mapped_column(String(20))
+    session_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+    )
+
+    __table_args__ = (
+        Index("uq_schedule_runs_user_week", "username", "week_start", unique=True),
+    )
 
 
 class DailyQuestion(Base):
@@ -159,6 +198,11 @@ class ChatThread(Base):
     title: Mapped[Optional[str]] = mapped_column(String(120))
     owner_username: Mapped[Optional[str]] = mapped_column(String(50))
     group_photo: Mapped[Optional[str]] = mapped_column(Text)
+    # Denormalized inbox fields, kept current whenever a message is written.
+    last_message_id: Mapped[Optional[int]] = mapped_column(Integer)
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # Set when the thread is deleted; its history is purged afterwards.
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     created_at: Mapped[datetime] = mapped_column(
         DateTime,
         nullable=False,
@@ -190,9 +234,34 @@ class ChatMessage(Base):
         nullable=False,
         default=datetime.utcnow,
     )
+    # Client-generated idempotency key; retries with the same key are deduplicated.
+    client_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
 
     thread = relationship("ChatThread", back_populates="messages")
 
+    __table_args__ = (
+        Index(
+            "ix_chat_messages_thread_created_id",
+            "thread_id",
+            "created_at",
+            "message_id",
+        ),
+        Index("ix_chat_messages_thread_message", "thread_id", "message_id"),
+        Index(
+            "uq_chat_messages_client_key",
+            "thread_id",
+            "sender",
+            "client_key",
+            unique=True,
+        ),
+        # Full-text search (chat_search.py); expression index, Postgres only.
+        Index(
+            "ix_chat_messages_content_fts",
+            text(f"to_tsvector('{CHAT_SEARCH_CONFIG}'::regconfig, content)"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+
 
 class ChatParticipant(Base):
     __tablename__ = "chat_participants"
@@ -208,9 +277,71 @@ class ChatParticipant(Base):
         nullable=False,
         default=datetime.utcnow,
     )
+    # Read watermark and unread counter, maintained by chat_reads.py.
+    last_read_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    unread_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
 
     thread = relationship("ChatThread", back_populates="participants")
 
+    __table_args__ = (
+        Index("ix_chat_participants_username_thread", "username", "thread_id"),
+        Index("ix_chat_participants_thread_username", "thread_id", "username"),
+    )
+
+
+class ChatMessageArchive(Base):
+    """A compressed chunk of old messages from one thread and one month.
+
+    `payload` is zlib-compressed JSON, a list of
+    [message_id, sender, content, created_at, client_key] rows ordered by
+    (created_at, message_id). Written by jobs/archive_chat_messages.py and
+    read through chat_archive.py.
+    """
+
+    __tablename__ = "chat_message_archive"
+
+    archive_id: Mapped[int] = mapped_column(primary_key=True)
+    thread_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    month: Mapped[date] = mapped_column(Date, nullable=False)
+    min_message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_chat_message_archive_thread_last",
+            "thread_id",
+            "last_created_at",
+        ),
+    )
+
+
+class MaintenanceJob(Base):
+    __tablename__ = "maintenance_jobs"
+
+    job_name: Mapped[str] = mapped_column(String(80), primary_key=True)
+    cursor: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+    )
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
 
 class Group(Base):
     __tablename__ = "groups"
@@ -338,6 +469,8 @@ class Course(Base):
     username: Mapped[str] = mapped_column(String(50), nullable=False)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text)
+    # Credits parsed from the description (schedule_planner.extract_ects) when it is written.
+    ects: Mapped[Optional[float]] = mapped_column(Float)
     instructor: Mapped[Optional[str]] = mapped_column(String(120))
     location: Mapped[Optional[str]] = mapped_column(String(120))
     color: Mapped[Optional[str]] = mapped_column(String(20))
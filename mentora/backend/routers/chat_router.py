@@ -1,13 +1,39 @@
 from __future__ import annotations
 
-import json
-from datetime import datetime
-
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
-from sqlalchemy import or_
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
+from chat_archive import (
+    archived_after,
+    archived_before,
+    find_archived,
+    mark_deleted,
+    purge_thread,
+)
+from chat_codec import MsgpackCodec, batch_messages
+from chat_idempotency import client_keys
+from chat_manager import manager
+from chat_membership import membership_cache
+from chat_presence import STATUSES, friends_of
+from chat_reads import mark_read, read_receipts, record_sent
+from chat_search import index_message, remove_thread, search_messages as run_search
+from chat_writer import message_writer
+from config import CHAT_SYNC_OVERLAP_MS, CHAT_WRITE_BEHIND
+from database import run_in_db
 from deps import get_db
 from models import ChatMessage, ChatParticipant, ChatThread, Friend, Profile
 from schemas import (
@@ -15,44 +41,29 @@ from schemas import (
     ChatGroupUpdate,
     ChatMessageCreate,
     ChatMessageResponse,
+    ChatMessagesPage,
+    ChatSearchResponse,
+    ChatSyncResponse,
     ChatThreadAction,
     ChatThreadCreate,
     ChatThreadItem,
     ChatThreadsResponse,
+    PresenceResponse,
 )
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-
-class ConnectionManager:
-    def __init__(self) -> None:
-        self.active: dict[str, set[WebSocket]] = {}
-
-    async def connect(self, username: str, websocket: WebSocket) -> None:
-        await websocket.accept()
-        self.active.setdefault(username, set()).add(websocket)
-
-    def disconnect(self, username: str, websocket: WebSocket) -> None:
-        if username not in self.active:
-            return
-        self.active[username].discard(websocket)
-        if not self.active[username]:
-            self.active.pop(username, None)
-
-    async def send_to(self, username: str, payload: dict) -> None:
-        if username not in self.active:
-            return
-        dead: list[WebSocket] = []
-        for ws in self.active.get(username, set()):
-            try:
-                await ws.send_json(payload)
-            except RuntimeError:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(username, ws)
+WS_RESUME_LIMIT = 500
+WS_HISTORY_LIMIT = 200
 
 
-manager = ConnectionManager()
+def _get_thread(db: Session, thread_id: int) -> Optional[ChatThread]:
+    """The thread, unless it does not exist or has been deleted."""
+    return (
+        db.query(ChatThread)
+        .filter(ChatThread.thread_id == thread_id, ChatThread.deleted_at.is_(None))
+        .first()
+    )
 
 
 def _thread_friend(thread: ChatThread, username: str) -> str:
@@ -60,12 +71,19 @@ def _thread_friend(thread: ChatThread, username: str) -> str:
 
 
 def _participants_for_thread(db: Session, thread_id: int) -> list[str]:
+    cached = membership_cache.get(thread_id)
+    if cached is not None:
+        return list(cached)
+    version = membership_cache.version(thread_id)
     rows = (
-        db.query(ChatParticipant)
+        db.query(ChatParticipant.username)
         .filter(ChatParticipant.thread_id == thread_id)
         .all()
     )
-    return [row.username for row in rows]
+    members = [row.username for row in rows]
+    if members:
+        membership_cache.put(thread_id, members, version)
+    return members
 
 
 def _ensure_participant(db: Session, thread: ChatThread, username: str) -> None:
@@ -102,54 +120,36 @@ def _ensure_friendship(db: Session, username: str, friend_username: str) -> None
         )
 
 
-@router.get("/threads/{username}", response_model=ChatThreadsResponse)
-async def list_threads(username: str, db: Session = Depends(get_db)):
-    legacy_threads = (
-        db.query(ChatThread)
-        .filter(or_(ChatThread.user_a == username, ChatThread.user_b == username))
-        .all()
+def _inbox_items(
+    db: Session,
+    username: str,
+    updated_since: Optional[datetime] = None,
+) -> list[ChatThreadItem]:
+    """The user's threads, newest first, built from a single query."""
+    members_count = (
+        select(func.count(ChatParticipant.participant_id))
+        .where(ChatParticipant.thread_id == ChatThread.thread_id)
+        .correlate(ChatThread)
+        .scalar_subquery()
     )
-    needs_commit = False
-    for legacy in legacy_threads:
-        existing_members = _participants_for_thread(db, legacy.thread_id)
-        if not existing_members:
-            db.add_all(
-                [
-                    ChatParticipant(
-                        thread_id=legacy.thread_id,
-                        username=legacy.user_a,
-                    ),
-                    ChatParticipant(
-                        thread_id=legacy.thread_id,
-                        username=legacy.user_b,
-                    ),
-                ]
-            )
-            needs_commit = True
-    if needs_commit:
-        db.commit()
-
-    threads = (
-        db.query(ChatThread)
+    query = (
+        db.query(
+            ChatThread,
+            ChatMessage.content,
+            members_count,
+            ChatParticipant.unread_count,
+            ChatParticipant.last_read_message_id,
+        )
         .join(ChatParticipant, ChatParticipant.thread_id == ChatThread.thread_id)
+        .outerjoin(ChatMessage, ChatMessage.message_id == ChatThread.last_message_id)
         .filter(ChatParticipant.username == username)
-        .order_by(ChatThread.updated_at.desc())
-        .all()
     )
+    if updated_since is not None:
+        query = query.filter(ChatThread.updated_at > updated_since)
+    rows = query.order_by(ChatThread.updated_at.desc()).all()
 
     items: list[ChatThreadItem] = []
-    for thread in threads:
-        last_message = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.thread_id == thread.thread_id)
-            .order_by(ChatMessage.created_at.desc())
-            .first()
-        )
-        members_count = (
-            db.query(ChatParticipant)
-            .filter(ChatParticipant.thread_id == thread.thread_id)
-            .count()
-        )
+    for thread, last_content, count, unread_count, last_read_message_id in rows:
         items.append(
             ChatThreadItem(
                 thread_id=thread.thread_id,
@@ -160,13 +160,194 @@ async def list_threads(username: str, db: Session = Depends(get_db)):
                 title=thread.title,
                 owner_username=thread.owner_username,
                 group_photo=thread.group_photo,
-                members_count=members_count,
-                last_message=last_message.content if last_message else None,
-                last_message_at=last_message.created_at if last_message else None,
+                members_count=count,
+                last_message=last_content,
+                last_message_at=thread.last_message_at,
+                unread_count=unread_count,
+                last_read_message_id=last_read_message_id,
+            )
+        )
+    return items
+
+
+def _sync_changes(
+    db: Session,
+    username: str,
+    since_message_id: int,
+    since: Optional[datetime],
+    limit: int,
+) -> ChatSyncResponse:
+    """Messages after `since_message_id` plus inbox changes, with a cursor
+    that is held back by CHAT_SYNC_OVERLAP_MS.
+
+    Ids are taken before commit, so a lower id can become visible after a
+    higher one has already been returned. The cursor only moves past messages
+    created more than the overlap ago; anything newer is returned again on the
+    next sync. Messages that commit within the overlap of getting their id are
+    never skipped, and clients dedupe replays by message_id.
+    """
+    server_time = datetime.utcnow()
+    rows = (
+        db.query(ChatMessage)
+        .join(ChatParticipant, ChatParticipant.thread_id == ChatMessage.thread_id)
+        .filter(
+            ChatParticipant.username == username,
+            ChatMessage.message_id > since_message_id,
+        )
+        .order_by(ChatMessage.message_id.asc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    messages = rows[:limit]
+
+    settled = server_time - timedelta(milliseconds=CHAT_SYNC_OVERLAP_MS)
+    cursor = since_message_id
+    for message in messages:
+        if message.created_at > settled:
+            break
+        cursor = message.message_id
+    if has_more and cursor == since_message_id:
+        # A full page inside the overlap; move on rather than loop on it.
+        cursor = messages[-1].message_id
+
+    if since is None and since_message_id:
+        since = (
+            db.query(ChatMessage.created_at)
+            .filter(ChatMessage.message_id == since_message_id)
+            .scalar()
+        )
+    threads = _inbox_items(db, username, updated_since=since)
+
+    return ChatSyncResponse(
+        messages=messages,
+        threads=threads,
+        cursor=cursor,
+        has_more=has_more,
+        server_time=server_time,
+    )
+
+
+def _history_page(
+    db: Session,
+    thread_id: int,
+    before: Optional[int],
+    after: Optional[int],
+    limit: int,
+) -> tuple[list[ChatMessage], Optional[int]]:
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either before or after, not both",
+        )
+
+    key = tuple_(ChatMessage.created_at, ChatMessage.message_id)
+    query = db.query(ChatMessage).filter(ChatMessage.thread_id == thread_id)
+
+    # Archived messages are all older than the hot table's, so a page only
+    # touches the archive once the hot rows in its direction run out.
+    cursor_id = before if before is not None else after
+    cursor_key = None
+    cursor_archived = False
+    if cursor_id is not None:
+        cursor = (
+            db.query(ChatMessage.created_at, ChatMessage.message_id)
+            .filter(
+                ChatMessage.thread_id == thread_id,
+                ChatMessage.message_id == cursor_id,
+            )
+            .first()
+        )
+        if cursor:
+            cursor_key = (cursor.created_at, cursor.message_id)
+        else:
+            archived = find_archived(db, thread_id, cursor_id)
+            if not archived:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Cursor message not found",
+                )
+            cursor_key = (archived["created_at"], archived["message_id"])
+            cursor_archived = True
+        if after is not None:
+            query = query.filter(key > tuple_(*cursor_key))
+        else:
+            query = query.filter(key < tuple_(*cursor_key))
+
+    if after is not None:
+        rows: list[ChatMessage] = []
+        if cursor_archived:
+            rows = [
+                ChatMessage(**row)
+                for row in archived_after(db, thread_id, cursor_key, limit + 1)
+            ]
+        if len(rows) <= limit:
+            rows += (
+                query.order_by(ChatMessage.created_at.asc(), ChatMessage.message_id.asc())
+                .limit(limit + 1 - len(rows))
+                .all()
             )
+        has_more = len(rows) > limit
+        messages = rows[:limit]
+        next_cursor = messages[-1].message_id if has_more else None
+    else:
+        rows = (
+            query.order_by(ChatMessage.created_at.desc(), ChatMessage.message_id.desc())
+            .limit(limit + 1)
+            .all()
         )
+        if len(rows) <= limit:
+            oldest = (rows[-1].created_at, rows[-1].message_id) if rows else cursor_key
+            older = archived_before(db, thread_id, oldest, limit + 1 - len(rows))
+            rows += [ChatMessage(**row) for row in reversed(older)]
+        has_more = len(rows) > limit
+        messages = list(reversed(rows[:limit]))
+        next_cursor = messages[0].message_id if has_more else None
+
+    return messages, next_cursor
+
+
+@router.get("/threads/{username}", response_model=ChatThreadsResponse)
+async def list_threads(username: str, db: Session = Depends(get_db)):
+    return {"threads": _inbox_items(db, username)}
 
-    return {"threads": items}
+
+@router.get("/sync/{username}", response_model=ChatSyncResponse)
+async def sync_changes(
+    username: str,
+    since_message_id: int = 0,
+    since: Optional[datetime] = None,
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_db),
+):
+    """Everything that changed for `username` after a cursor, for reconnects.
+
+    `messages` holds new messages across all of the user's threads, oldest
+    first. Pass the returned `cursor` back as `since_message_id`, and repeat
+    while `has_more` is true. `threads` lists the inbox entries updated after
+    `since`; when `since` is omitted, the cursor message's timestamp is used.
+
+    The cursor trails the newest message by CHAT_SYNC_OVERLAP_MS so that
+    messages committed out of id order are not skipped. Recent messages can
+    therefore be returned by more than one sync; dedupe them by message_id.
+    """
+    return _sync_changes(db, username, since_message_id, since, limit)
+
+
+@router.get("/search/{username}", response_model=ChatSearchResponse)
+async def search_messages(
+    username: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """Ranked full-text search over the messages of `username`'s threads."""
+    hits = run_search(db, username, q, limit + 1, offset)
+    return {
+        "hits": hits[:limit],
+        "next_offset": offset + limit if len(hits) > limit else None,
+    }
 
 
 @router.post("/threads", response_model=ChatThreadItem)
@@ -194,27 +375,12 @@ async def create_thread(payload: ChatThreadCreate, db: Session = Depends(get_db)
                 & (ChatThread.user_b == payload.friend_username),
                 (ChatThread.user_a == payload.friend_username)
                 & (ChatThread.user_b == payload.username),
-            )
+            ),
+            ChatThread.deleted_at.is_(None),
         )
         .first()
     )
     if existing:
-        existing_members = _participants_for_thread(db, existing.thread_id)
-        if not existing_members:
-            db.add_all(
-                [
-                    ChatParticipant(
-                        thread_id=existing.thread_id,
-                        username=existing.user_a,
-                    ),
-                    ChatParticipant(
-                        thread_id=existing.thread_id,
-                        username=existing.user_b,
-                    ),
-                ]
-            )
-            db.commit()
-            existing_members = _participants_for_thread(db, existing.thread_id)
         members_count = (
             db.query(ChatParticipant)
             .filter(ChatParticipant.thread_id == existing.thread_id)
@@ -331,20 +497,27 @@ async def create_group(payload: ChatGroupCreate, db: Session = Depends(get_db)):
     )
 
 
-@router.get("/messages/{thread_id}", response_model=list[ChatMessageResponse])
-async def list_messages(thread_id: int, db: Session = Depends(get_db)):
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.thread_id == thread_id)
-        .order_by(ChatMessage.created_at.asc())
-        .all()
-    )
-    return messages
+@router.get("/messages/{thread_id}", response_model=ChatMessagesPage)
+async def list_messages(
+    thread_id: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    """Keyset-paginated history, always returned oldest first.
+
+    Without a cursor the latest `limit` messages are returned and
+    `next_cursor` is the `before` value for the previous page. With `after`
+    the page moves forward and `next_cursor` is the next `after` value.
+    """
+    messages, next_cursor = _history_page(db, thread_id, before, after, limit)
+    return {"messages": messages, "next_cursor": next_cursor}
 
 
 @router.post("/messages", response_model=ChatMessageResponse)
 async def create_message(payload: ChatMessageCreate, db: Session = Depends(get_db)):
-    thread = db.query(ChatThread).filter(ChatThread.thread_id == payload.thread_id).first()
+    thread = _get_thread(db, payload.thread_id)
     if not thread:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -352,25 +525,24 @@ async def create_message(payload: ChatMessageCreate, db: Session = Depends(get_d
         )
     _ensure_participant(db, thread, payload.sender)
 
-    message = ChatMessage(
-        thread_id=payload.thread_id,
-        sender=payload.sender,
-        content=payload.content,
+    row, _ = await _store_message(
+        payload.sender,
+        payload.thread_id,
+        payload.content,
+        payload.client_key,
+        durable=True,
     )
-    thread.updated_at = datetime.utcnow()
-    db.add(message)
-    db.commit()
-    db.refresh(message)
-    return message
+    return row
 
 
 @router.delete("/threads/{thread_id}")
 async def delete_thread(
     thread_id: int,
     payload: ChatThreadAction,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
-    thread = db.query(ChatThread).filter(ChatThread.thread_id == thread_id).first()
+    thread = _get_thread(db, thread_id)
     if not thread:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -386,16 +558,19 @@ async def delete_thread(
     else:
         _ensure_participant(db, thread, payload.username)
 
-    db.query(ChatMessage).filter(ChatMessage.thread_id == thread_id).delete()
-    db.query(ChatParticipant).filter(ChatParticipant.thread_id == thread_id).delete()
-    db.delete(thread)
+    # The thread disappears in one commit; its history is purged afterwards
+    # (or by jobs/purge_deleted_threads.py if the process dies first).
+    mark_deleted(db, thread_id)
     db.commit()
+    remove_thread(thread_id)
+    await manager.membership_changed(thread_id)
+    background_tasks.add_task(run_in_db, purge_thread, thread_id)
     return {"message": "Thread deleted"}
 
 
 @router.get("/groups/{thread_id}/participants", response_model=list[str])
 async def list_group_participants(thread_id: int, db: Session = Depends(get_db)):
-    thread = db.query(ChatThread).filter(ChatThread.thread_id == thread_id).first()
+    thread = _get_thread(db, thread_id)
     if not thread or not thread.is_group:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -411,7 +586,7 @@ async def update_group(
     payload: ChatGroupUpdate,
     db: Session = Depends(get_db),
 ):
-    thread = db.query(ChatThread).filter(ChatThread.thread_id == thread_id).first()
+    thread = _get_thread(db, thread_id)
     if not thread or not thread.is_group:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -476,12 +651,13 @@ async def update_group(
     thread.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(thread)
+    if add_members or remove_members:
+        await manager.membership_changed(thread_id)
 
     last_message = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.thread_id == thread.thread_id)
-        .order_by(ChatMessage.created_at.desc())
-        .first()
+        db.get(ChatMessage, thread.last_message_id)
+        if thread.last_message_id
+        else None
     )
 
     return ChatThreadItem(
@@ -492,70 +668,346 @@ async def update_group(
         group_photo=thread.group_photo,
         members_count=len(next_participants),
         last_message=last_message.content if last_message else None,
-        last_message_at=last_message.created_at if last_message else None,
+        last_message_at=thread.last_message_at,
+    )
+
+
+@router.get("/presence/{username}", response_model=PresenceResponse)
+async def friends_presence(username: str, db: Session = Depends(get_db)):
+    """Current presence of `username`'s friends, served from memory."""
+    friends = friends_of(db, [username]).get(username, [])
+    return {"friends": manager.presence.snapshot(sorted(friends))}
+
+
+@router.get("/stats")
+async def connection_stats():
+    return {
+        **manager.stats(),
+        "write_behind": message_writer.stats(),
+        "read_receipts": read_receipts.stats(),
+        "client_keys": client_keys.stats(),
+    }
+
+
+def _ws_recipients(db: Session, username: str, thread_id: int) -> Optional[list[str]]:
+    """Participants of a thread `username` may post in, or None if not allowed."""
+    participants = _participants_for_thread(db, thread_id)
+    if participants:
+        return participants if username in participants else None
+    thread = _get_thread(db, thread_id)
+    if not thread or username not in (thread.user_a, thread.user_b):
+        return None
+    return [thread.user_a, thread.user_b]
+
+
+def _ws_history(
+    db: Session,
+    thread_id: int,
+    before: Optional[int],
+    after: Optional[int],
+    limit: int,
+) -> dict:
+    messages, next_cursor = _history_page(db, thread_id, before, after, limit)
+    rows = [
+        ChatMessageResponse.model_validate(message).model_dump(mode="json")
+        for message in messages
+    ]
+    return {
+        "type": "messages",
+        "thread_id": thread_id,
+        "next_cursor": next_cursor,
+        **batch_messages(rows),
+    }
+
+
+async def _ws_thread_recipients(username: str, thread_id: int) -> Optional[list[str]]:
+    # DB work runs on the DB thread pool so the loop keeps serving every
+    # other socket; a warm membership cache skips it entirely.
+    cached = membership_cache.get(thread_id)
+    if cached is not None:
+        return list(cached) if username in cached else None
+    return await run_in_db(_ws_recipients, username, thread_id)
+
+
+def _message_row(message: ChatMessage) -> dict:
+    return {
+        "message_id": message.message_id,
+        "thread_id": message.thread_id,
+        "sender": message.sender,
+        "content": message.content,
+        "created_at": message.created_at,
+        "client_key": message.client_key,
+    }
+
+
+def _find_by_client_key(
+    db: Session,
+    thread_id: int,
+    username: str,
+    client_key: str,
+) -> Optional[dict]:
+    message = (
+        db.query(ChatMessage)
+        .filter(
+            ChatMessage.thread_id == thread_id,
+            ChatMessage.sender == username,
+            ChatMessage.client_key == client_key,
+        )
+        .first()
+    )
+    return _message_row(message) if message else None
+
+
+def _persist_message(
+    db: Session,
+    username: str,
+    thread_id: int,
+    content: str,
+    client_key: Optional[str] = None,
+) -> tuple[dict, bool]:
+    """Insert a message and advance the thread's inbox columns in one commit.
+
+    Returns the row and whether it was inserted. If `client_key` was already
+    used in the thread, the unique index rejects the insert and the original
+    row is returned instead.
+    """
+    message = ChatMessage(
+        thread_id=thread_id,
+        sender=username,
+        content=content,
+        client_key=client_key,
+    )
+    db.add(message)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        existing = client_key and _find_by_client_key(db, thread_id, username, client_key)
+        if not existing:
+            raise
+        return existing, False
+    db.query(ChatThread).filter(ChatThread.thread_id == thread_id).update(
+        {
+            ChatThread.last_message_id: message.message_id,
+            ChatThread.last_message_at: message.created_at,
+            ChatThread.updated_at: message.created_at,
+        },
+        synchronize_session=False,
     )
+    row = _message_row(message)
+    record_sent(db, [row])
+    db.commit()
+    return row, True
+
+
+async def _store_message(
+    username: str,
+    thread_id: int,
+    content: str,
+    client_key: Optional[str],
+    durable: bool,
+    retry: bool = False,
+) -> tuple[dict, bool]:
+    """Store a message once per client_key; returns the row and whether it is new.
+
+    With CHAT_WRITE_BEHIND every message goes through the writer, so ids
+    come from one place in send order; `durable` waits for its flush.
+    Retries inside the key window are answered from memory, and concurrent
+    retries wait for the first attempt. Later retries are caught by the
+    unique index or, for write-behind, by a lookup before buffering. That
+    lookup costs a round trip, so buffered sends only make it when the
+    client marks the frame as a retry; REST sends wait for a flush anyway.
+    """
+    key = (thread_id, username, client_key) if client_key else None
+    if key is not None:
+        existing = await client_keys.claim(key)
+        if existing is not None:
+            return existing, False
+    try:
+        existing = None
+        if CHAT_WRITE_BEHIND and key is not None and (durable or retry):
+            existing = await run_in_db(_find_by_client_key, thread_id, username, client_key)
+        if existing is not None:
+            row, created = existing, False
+        elif CHAT_WRITE_BEHIND:
+            row = await message_writer.submit(thread_id, username, content, client_key, durable)
+            created = True
+        else:
+            row, created = await run_in_db(_persist_message, username, thread_id, content, client_key)
+    except BaseException:
+        if key is not None:
+            client_keys.release(key)
+        raise
+    if key is not None:
+        client_keys.complete(key, row)
+    if created:
+        index_message(row)
+    return row, created
 
 
 @router.websocket("/ws/{username}")
 async def websocket_chat(websocket: WebSocket, username: str):
-    await manager.connect(username, websocket)
-    db = SessionLocal()
+    codec = await manager.connect(username, websocket)
     try:
         while True:
-            raw = await websocket.receive_text()
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
             try:
-                payload = json.loads(raw)
-            except json.JSONDecodeError:
-                await websocket.send_json({"type": "error", "message": "Invalid JSON"})
+                data = received.get("text")
+                payload = codec.decode(data if data is not None else received.get("bytes"))
+                if not isinstance(payload, dict):
+                    raise ValueError("frame is not an object")
+            except Exception:
+                manager.reply(username, websocket, {"type": "error", "message": "Invalid frame"})
+                continue
+
+            frame_type = payload.get("type")
+            if frame_type == "heartbeat":
+                status_value = payload.get("status")
+                if status_value not in STATUSES - {"offline"}:
+                    status_value = None
+                manager.presence.touch(username, status_value, heartbeat=True)
+                continue
+            manager.presence.touch(username)
+
+            if frame_type == "resume":
+                try:
+                    since_message_id = int(payload.get("since_message_id") or 0)
+                    since = payload.get("since")
+                    since = datetime.fromisoformat(since) if since else None
+                except (TypeError, ValueError):
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid cursor"})
+                    continue
+                changes = await run_in_db(
+                    _sync_changes,
+                    username,
+                    since_message_id,
+                    since,
+                    WS_RESUME_LIMIT,
+                )
+                sync = {"type": "sync", **changes.model_dump(mode="json")}
+                if codec is MsgpackCodec:
+                    sync["messages"] = batch_messages(sync["messages"])
+                manager.reply(username, websocket, sync)
+                continue
+
+            if frame_type == "history":
+                try:
+                    thread_id = int(payload.get("thread_id"))
+                    before = payload.get("before")
+                    before = int(before) if before is not None else None
+                    after = payload.get("after")
+                    after = int(after) if after is not None else None
+                    limit = min(max(int(payload.get("limit") or 50), 1), WS_HISTORY_LIMIT)
+                except (TypeError, ValueError):
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid cursor"})
+                    continue
+                if await _ws_thread_recipients(username, thread_id) is None:
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
+                    continue
+                try:
+                    page = await run_in_db(_ws_history, thread_id, before, after, limit)
+                except HTTPException as exc:
+                    manager.reply(username, websocket, {"type": "error", "message": exc.detail})
+                    continue
+                manager.reply(username, websocket, page)
+                continue
+
+            if frame_type == "mark_read":
+                try:
+                    thread_id = int(payload.get("thread_id"))
+                    message_id = payload.get("message_id")
+                    message_id = int(message_id) if message_id is not None else None
+                except (TypeError, ValueError):
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
+                    continue
+                result = await run_in_db(mark_read, username, thread_id, message_id)
+                if result is None:
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
+                    continue
+                manager.reply(username, websocket, {"type": "read_ack", **result})
+                if result["last_read_message_id"]:
+                    read_receipts.queue(
+                        thread_id,
+                        username,
+                        result["last_read_message_id"],
+                        await _ws_thread_recipients(username, thread_id) or [],
+                    )
+                continue
+
+            if frame_type == "typing":
+                try:
+                    thread_id = int(payload.get("thread_id"))
+                except (TypeError, ValueError):
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
+                    continue
+                participants = await _ws_thread_recipients(username, thread_id)
+                if participants is None:
+                    manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
+                    continue
+                manager.presence.typing(
+                    thread_id,
+                    username,
+                    bool(payload.get("typing", True)),
+                    participants,
+                )
                 continue
 
             thread_id = payload.get("thread_id")
             content = (payload.get("content") or "").strip()
             if not thread_id or not content:
-                await websocket.send_json(
-                    {"type": "error", "message": "Missing thread_id or content"}
+                manager.reply(
+                    username,
+                    websocket,
+                    {"type": "error", "message": "Missing thread_id or content"},
                 )
                 continue
+            try:
+                thread_id = int(thread_id)
+            except (TypeError, ValueError):
+                manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
+                continue
 
-            thread = (
-                db.query(ChatThread)
-                .filter(ChatThread.thread_id == int(thread_id))
-                .first()
-            )
-            if not thread:
-                await websocket.send_json({"type": "error", "message": "Invalid thread"})
+            participants = await _ws_thread_recipients(username, thread_id)
+            if participants is None:
+                manager.reply(username, websocket, {"type": "error", "message": "Invalid thread"})
                 continue
-            try:
-                _ensure_participant(db, thread, username)
-            except HTTPException:
-                await websocket.send_json({"type": "error", "message": "Invalid thread"})
+
+            client_key = payload.get("client_key")
+            if client_key is not None and (
+                not isinstance(client_key, str) or not 0 < len(client_key) <= 64
+            ):
+                manager.reply(username, websocket, {"type": "error", "message": "Invalid client_key"})
                 continue
 
-            message = ChatMessage(
-                thread_id=thread.thread_id,
-                sender=username,
-                content=content,
+            row, created = await _store_message(
+                username,
+                thread_id,
+                content,
+                client_key,
+                durable=False,
+                # Clients resending after a lost ack set "retry": true.
+                retry=bool(payload.get("retry")),
+            )
+            message = {**row, "created_at": row["created_at"].isoformat()}
+            if not created:
+                # A retry: acknowledge to the sender only, nobody else sees it
+                # twice. Not a "message" frame, which clients append as a bubble;
+                # the client_key in it matches the pending send to reconcile.
+                manager.reply(
+                    username,
+                    websocket,
+                    {"type": "message_ack", "message": message, "duplicate": True},
+                )
+                continue
+            manager.presence.typing(thread_id, username, False, participants)
+
+            await manager.send_to_many(
+                participants,
+                {"type": "message", "message": message},
             )
-            thread.updated_at = datetime.utcnow()
-            db.add(message)
-            db.commit()
-            db.refresh(message)
-
-            message_payload = {
-                "message_id": message.message_id,
-                "thread_id": message.thread_id,
-                "sender": message.sender,
-                "content": message.content,
-                "created_at": message.created_at.isoformat(),
-            }
-
-            participants = _participants_for_thread(db, thread.thread_id)
-            if not participants:
-                participants = [thread.user_a, thread.user_b]
-
-            for participant in set(participants):
-                await manager.send_to(participant, {"type": "message", "message": message_payload})
     except WebSocketDisconnect:
-        manager.disconnect(username, websocket)
+        pass
     finally:
-        db.close()
+        manager.disconnect(username, websocket)
@@ -9,7 +9,9 @@ import json
 from config import GEMINI_API_KEY, GEMINI_MODEL
 from deps import get_db
 from datetime import date, datetime, timedelta
-from models import Course, CourseBlock, Profile, StudySession
+from models import Course, CourseBlock, Profile, ScheduleRun, StudySession
+from schedule_planner import extract_ects, upcoming_monday
+from schedule_store import repair_plan
 from schemas import CourseCreate, CourseResponse, CourseUpdate
 from google import genai
 from google.genai import types
@@ -17,6 +19,7 @@ from google.genai import types
 router = APIRouter(prefix="/courses", tags=["courses"])
 
 logger = logging.getLogger("mentora.ocr")
+schedule_logger = logging.getLogger("mentora.scheduler")
 OCR_DEBUG = os.getenv("OCR_DEBUG", "0") == "1"
 
 
@@ -525,6 +528,28 @@ def _parse_schedule_tokens(tokens: list[dict[str, float | str]]) -> list[dict[st
     return payloads
 
 
+def _repair_schedule(
+    db: Session,
+    username: str,
+    changed_days: set[str] | None = None,
+    renamed: dict[str, str] | None = None,
+) -> None:
+    """Fit the user's planned week to their new course blocks, if they have one.
+
+    Runs in its own transaction after the course change has committed. A
+    failure is logged and leaves the old plan in place.
+    """
+    try:
+        stats = repair_plan(db, username, date.today(), changed_days, renamed)
+        db.commit()
+    except Exception:
+        db.rollback()
+        schedule_logger.exception("Failed repairing study plan for %s", username)
+        return
+    if stats:
+        schedule_logger.info("Repaired study plan for %s: %s", username, stats)
+
+
 @router.options("")
 async def options_courses():
     return {}
@@ -550,9 +575,8 @@ async def clear_courses(username: str, db: Session = Depends(get_db)):
         db.delete(course)
 
     # Delete scheduled study sessions for the upcoming week (same window the scheduler creates)
-    today = date.today()
-    days_until_next_monday = 7 - today.weekday()
-    next_monday = datetime.combine(today + timedelta(days=days_until_next_monday), datetime.min.time())
+    week_start = upcoming_monday(date.today())
+    next_monday = datetime.combine(week_start, datetime.min.time())
     next_sunday_end = next_monday + timedelta(days=7)
     sessions = (
         db.query(StudySession)
@@ -563,6 +587,11 @@ async def clear_courses(username: str, db: Session = Depends(get_db)):
     )
     for session in sessions:
         db.delete(session)
+    db.flush()
+    db.query(ScheduleRun).filter(
+        ScheduleRun.username == username,
+        ScheduleRun.week_start == week_start,
+    ).delete(synchronize_session=False)
 
     db.commit()
     return {"deleted": len(existing), "sessions_deleted": len(sessions)}
@@ -581,6 +610,7 @@ async def create_course(payload: CourseCreate, db: Session = Depends(get_db)):
         username=payload.username,
         name=payload.name,
         description=payload.description,
+        ects=extract_ects(payload.description),
         instructor=payload.instructor,
         location=payload.location,
         color=payload.color,
@@ -592,6 +622,7 @@ async def create_course(payload: CourseCreate, db: Session = Depends(get_db)):
 
     db.add(course)
     db.commit()
+    _repair_schedule(db, payload.username, {block.day for block in payload.blocks})
     db.refresh(course)
     return course
 
@@ -615,8 +646,13 @@ async def update_course(
             detail="Not allowed to edit this course",
         )
 
+    old_name = course.name
+    old_blocks = {(b.day, b.start, b.end) for b in course.blocks}
+    new_blocks = {(b.day, b.start, b.end) for b in payload.blocks}
+
     course.name = payload.name
     course.description = payload.description
+    course.ects = extract_ects(payload.description)
     course.instructor = payload.instructor
     course.location = payload.location
     if payload.color is not None:
@@ -629,6 +665,12 @@ async def update_course(
     ]
 
     db.commit()
+    _repair_schedule(
+        db,
+        course.username,
+        {day for day, _, _ in old_blocks ^ new_blocks},
+        {old_name: course.name} if old_name != course.name else None,
+    )
     db.refresh(course)
     return course
 
@@ -734,6 +776,7 @@ async def import_schedule(
             username=username,
             name=course_data["name"],
             description=course_data["description"],
+            ects=extract_ects(course_data["description"]),
             instructor="",
             location=course_data["location"],
             color=COURSE_COLORS[index % len(COURSE_COLORS)],
@@ -759,6 +802,11 @@ async def import_schedule(
         created_courses.append(course)
 
     db.commit()
+    _repair_schedule(
+        db,
+        username,
+        None if replace_existing else {b.day for c in created_courses for b in c.blocks},
+    )
     for course in created_courses:
         db.refresh(course)
     return created_courses
@@ -830,6 +878,7 @@ async def import_syllabus(
         )
 
     course.description = description
+    course.ects = extract_ects(description)
     db.commit()
     db.refresh(course)
     return course
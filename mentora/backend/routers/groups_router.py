@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, status
 from sqlalchemy import func, or_, select
 from sqlalchemy.orm import Session
 
+from chat_archive import mark_deleted, purge_thread
+from chat_manager import manager
+from chat_search import remove_thread as remove_thread_from_search
+from database import run_in_db
 from deps import get_db
 from models import (
-    ChatMessage,
     ChatParticipant,
     ChatThread,
     Group,
@@ -402,6 +405,8 @@ async def update_group(
         )
 
     db.commit()
+    if remove_members:
+        await manager.membership_changed(group.chat_thread_id)
 
     return GroupListItem(
         group_id=group.group_id,
@@ -446,12 +451,14 @@ async def leave_group(
         .delete(synchronize_session=False)
     )
     db.commit()
+    await manager.membership_changed(group.chat_thread_id)
     return {"detail": "Left group"}
 
 
 @router.delete("/{group_id}")
 async def delete_group(
     group_id: int,
+    background_tasks: BackgroundTasks,
     username: str | None = None,
     payload: GroupAction | None = Body(default=None),
     db: Session = Depends(get_db),
@@ -465,16 +472,6 @@ async def delete_group(
         )
     _ensure_owner(group, resolved_username)
 
-    (
-        db.query(ChatMessage)
-        .filter(ChatMessage.thread_id == group.chat_thread_id)
-        .delete(synchronize_session=False)
-    )
-    (
-        db.query(ChatParticipant)
-        .filter(ChatParticipant.thread_id == group.chat_thread_id)
-        .delete(synchronize_session=False)
-    )
     (
         db.query(GroupInvite)
         .filter(GroupInvite.group_id == group.group_id)
@@ -495,12 +492,11 @@ async def delete_group(
         .filter(Group.group_id == group.group_id)
         .delete(synchronize_session=False)
     )
-    (
-        db.query(ChatThread)
-        .filter(ChatThread.thread_id == group.chat_thread_id)
-        .delete(synchronize_session=False)
-    )
+    mark_deleted(db, group.chat_thread_id)
     db.commit()
+    remove_thread_from_search(group.chat_thread_id)
+    await manager.membership_changed(group.chat_thread_id)
+    background_tasks.add_task(run_in_db, purge_thread, group.chat_thread_id)
     return {"detail": "Group deleted"}
 
 
@@ -508,10 +504,12 @@ async def delete_group(
 async def delete_group_post(
     group_id: int,
     payload: GroupAction,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     return await delete_group(
         group_id=group_id,
+        background_tasks=background_tasks,
         username=payload.username,
         payload=payload,
         db=db,
@@ -657,6 +655,7 @@ async def accept_invite(
     _add_member(db, group.group_id, payload.username)
     _add_chat_participant(db, group.chat_thread_id, payload.username)
     db.commit()
+    await manager.membership_changed(group.chat_thread_id)
 
     return GroupInviteItem(
         invite_id=invite.invite_id,
@@ -792,6 +791,7 @@ async def approve_join_request(
     _add_member(db, group.group_id, request.username)
     _add_chat_participant(db, group.chat_thread_id, request.username)
     db.commit()
+    await manager.membership_changed(group.chat_thread_id)
 
     return GroupJoinRequestItem(
         request_id=request.request_id,
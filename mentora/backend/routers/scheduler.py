@@ -1,19 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from datetime import date, datetime, timedelta
 import json
 import logging
-import random
-
-from config import GEMINI_API_KEY, GEMINI_MODEL
-from deps import get_db
-from models import Course, CourseBlock, Personality, Emotion, StudySession, User
+import time
+
+from config import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL,
+    SCHEDULER_PLACER,
+    SCHEDULER_PREVIEW_TTL_MINUTES,
+    SCHEDULER_TIME_BUDGET_MS,
+)
+from deps import ALGORITHM, SECRET_KEY, create_access_token, get_db
+from models import StudySession
+from schemas import SchedulePreviewCommit
+from schedule_planner import PLACERS, make_placer, plan_week, upcoming_monday
+from schedule_store import current_runs, intact_runs, load_schedule_inputs, repair_plan, replace_plans
+from schedule_store import input_hash as store_input_hash
 from google import genai
 
 router = APIRouter(prefix="/scheduler", tags=["scheduler"])
 
 logger = logging.getLogger("mentora.scheduler")
 
+# Marks preview tokens so they can never pass as access tokens (those carry "sub").
+PREVIEW_TOKEN_KIND = "schedule_preview"
+
 prompt = '''You are an intelligent scheduler that creates personalized study plans.
 
 Use the provided USER_DATA appended after this instruction to generate a study schedule for the upcoming week.
@@ -303,380 +317,232 @@ async def create_schedule(username: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 '''
 
+def _session_payload(session: StudySession) -> dict:
+    return {
+        "session_id":       session.session_id,
+        "username":         session.username,
+        "mode":             session.mode,
+        "timer_type":       session.timer_type,
+        "duration_minutes": session.duration_minutes,
+        "started_at":       session.started_at.isoformat(),
+        "ended_at":         session.ended_at.isoformat(),
+    }
+
+
+def _check_placer(placer: str) -> None:
+    if placer not in PLACERS:
+        raise HTTPException(status_code=400, detail=f"Unknown placer; expected one of {sorted(PLACERS)}")
+
+
+def _plan(inputs: dict, week_start: date, placer: str) -> dict:
+    try:
+        return plan_week(
+            week_start,
+            inputs["courses"],
+            inputs["availability"],
+            inputs["personality_scores"],
+            inputs["emotion_scores"],
+            make_placer(placer, SCHEDULER_TIME_BUDGET_MS),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _save_plan(
+    db: Session,
+    username: str,
+    week_start: date,
+    run,
+    input_hash: str,
+    placer: str,
+    sessions: list[dict],
+) -> dict:
+    """Replace the week's previous plan in one transaction, so it is swapped completely or not at all."""
+    replacement = {
+        "username": username,
+        "run": run,
+        "input_hash": input_hash,
+        "placer": placer,
+        "sessions": sessions,
+    }
+    try:
+        rows = replace_plans(db, week_start, [replacement])
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed saving %d planned sessions for %s", len(sessions), username)
+        raise HTTPException(status_code=500, detail="Failed to save study plan")
+
+    created = [_session_payload(StudySession(**row)) for row in rows]
+    return {"created": len(created), "cached": False, "run_id": replacement["run"].run_id, "sessions": created}
+
+
 @router.post("/{username}")
-async def create_local_schedule(username: str, db: Session = Depends(get_db)):
-    """Local scheduler that uses ECTS (from description), OCEAN, and today's emotion.
+async def create_local_schedule(
+    username: str,
+    placer: str = Query(SCHEDULER_PLACER),
+    db: Session = Depends(get_db),
+):
+    """Local scheduler that uses ECTS (Course.ects), OCEAN, and today's emotion.
 
     This function places sessions directly into free 30-minute slots and persists them.
+    `placer` picks the phase 4 engine from schedule_planner.PLACERS.
     """
-
-    # Gather user courses
-    courses = db.query(Course).filter(Course.username == username).all()
-    # Gather course blocks (unavailable slots)
-    blocks = db.query(CourseBlock).join(Course).filter(Course.username == username).all()
-    availability = {}
-    for b in blocks:
-        availability.setdefault(b.day, []).append({"start": b.start, "end": b.end, "course": b.course.name})
-
-    # Resolve user
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+    _check_placer(placer)
+    today = date.today()
+    next_monday = upcoming_monday(today)
+    inputs = load_schedule_inputs(db, [username], today).get(username)
+    if inputs is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Personality (most recent)
-    personality = (
-        db.query(Personality)
-        .filter(Personality.user_id == user.user_id)
-        .order_by(Personality.test_date.desc())
-        .first()
-    )
-    personality_scores = personality.personality_scores if personality else {}
-
-    # Emotions for today
+    # --- Reuse the stored plan when nothing it depends on has changed ---
+    input_hash = store_input_hash(inputs, next_monday, placer)
+    run = current_runs(db, [username], next_monday, lock=True).get(username)
+    if run is not None and run.input_hash == input_hash and intact_runs(db, [run]):
+        existing = (
+            db.query(StudySession)
+            .filter(StudySession.schedule_run_id == run.run_id)
+            .order_by(StudySession.started_at)
+            .all()
+        )
+        db.rollback()
+        return {
+            "created": 0,
+            "cached": True,
+            "run_id": run.run_id,
+            "sessions": [_session_payload(row) for row in existing],
+        }
+
+    plan = _plan(inputs, next_monday, placer)
+    logger.info("Planned %s for %s: %s", next_monday, username, plan["stats"])
+    return _save_plan(db, username, next_monday, run, input_hash, placer, plan["sessions"])
+
+
+@router.post("/{username}/preview")
+async def preview_local_schedule(
+    username: str,
+    placer: str = Query(SCHEDULER_PLACER),
+    db: Session = Depends(get_db),
+):
+    """Plan next week in memory and return it without writing anything.
+
+    The response carries a signed token holding the proposed sessions;
+    POST /scheduler/{username}/commit with it saves exactly this plan.
+    Stats include the per-phase planner timings and the time spent loading
+    inputs (`load`), all in milliseconds.
+    """
+    _check_placer(placer)
+    started = time.perf_counter()
     today = date.today()
-    emotion = (
-        db.query(Emotion)
-        .filter(Emotion.user_id == user.user_id)
-        .filter(Emotion.emotion_test_date == today)
-        .first()
+    next_monday = upcoming_monday(today)
+    inputs = load_schedule_inputs(db, [username], today).get(username)
+    if inputs is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    loaded = time.perf_counter()
+
+    plan = _plan(inputs, next_monday, placer)
+    expires = timedelta(minutes=SCHEDULER_PREVIEW_TTL_MINUTES)
+    token = create_access_token(
+        {
+            "kind": PREVIEW_TOKEN_KIND,
+            "username": username,
+            "week_start": next_monday.isoformat(),
+            "input_hash": store_input_hash(inputs, next_monday, placer),
+            "placer": placer,
+            # [course, start, duration, focus] per session keeps the token small.
+            "sessions": [
+                [
+                    session["course"],
+                    session["started_at"].isoformat(timespec="minutes"),
+                    session["duration_minutes"],
+                    session["focus_minutes"],
+                ]
+                for session in plan["sessions"]
+            ],
+        },
+        expires,
     )
-    emotion_scores = emotion.emotion_scores if emotion else None
-
-    # --- Constants ---
-    MINUTES_PER_ECTS_TOTAL = 1500
-    WEEKS_PER_TERM = 15
-    MIN_SESSIONS_PER_DAY = 2
-    MAX_SESSIONS_PER_DAY = 6
-    MIN_FOCUS_PER_SESSION = 30   # minutes
-    MAX_FOCUS_PER_SESSION = 90   # minutes
-    DEFAULT_DAY_START = 8
-    DEFAULT_DAY_END = 22
-    SLOT_MINUTES = 30
-
-    import re
-
-    def extract_ects(description: str) -> float:
-        if not description:
-            return 0.0
-
-        # All patterns tried in order of specificity.
-        # Each pattern captures the numeric credit value.
-        patterns = [
-            # "ECTS Credits: 6" / "ECTS Credits of the Course: 6,5"
-            r"ECTS\s+Credits?[^0-9\n\r]{0,30}([0-9]+(?:[.,][0-9]+)?)",
-            # "AKTS Kredisi: 6" / "AKTS: 6"  (Turkish equivalent)
-            r"AKTS[^0-9\n\r]{0,30}([0-9]+(?:[.,][0-9]+)?)",
-            # "6 ECTS" / "6.5 ECTS" / "6,5 ECTS"
-            r"([0-9]+(?:[.,][0-9]+)?)\s*ECTS",
-            # "6 AKTS"
-            r"([0-9]+(?:[.,][0-9]+)?)\s*AKTS",
-            # Generic: "ECTS: 6" / "ects 6"
-            r"ECTS[^0-9\n\r]{0,10}([0-9]+(?:[.,][0-9]+)?)",
-            # "Credit Hours: 3" / "Credit Value: 6" / "Credits: 6"
-            r"Credits?(?:\s+(?:Hours?|Value|Points?))?\s*[:\-]?\s*([0-9]+(?:[.,][0-9]+)?)",
-            # "Course Credits: 6" / "Course Credit: 3"
-            r"Course\s+Credits?\s*[:\-]\s*([0-9]+(?:[.,][0-9]+)?)",
-            # "Kredi: 6"  (Turkish)
-            r"Kredi\s*[:\-]?\s*([0-9]+(?:[.,][0-9]+)?)",
-        ]
-
-        for pat in patterns:
-            m = re.search(pat, description, re.I)
-            if m:
-                value = float(m.group(1).replace(",", "."))
-                # Sanity-check: ECTS values are typically 1–30
-                if 1.0 <= value <= 30.0:
-                    return value
-
-        return 0.0
-
-    def get_personality(name: str, default: float = 3.0) -> float:
-        try:
-            return float(personality_scores.get(name, default))
-        except Exception:
-            return default
-
-    def compute_daily_energy(em: dict) -> float:
-        if not em:
-            return 0.0
-        joy     = em.get("joy",     0) or 0
-        neutral = em.get("neutral", 0) or 0
-        sadness = em.get("sadness", 0) or 0
-        fear    = em.get("fear",    0) or 0
-        anger   = em.get("anger",   0) or 0
-        disgust = em.get("disgust", 0) or 0
-        energy  = 8 * joy + 2 * neutral - 2.5 * (sadness + fear + anger + disgust)
-        return 0.0 if neutral > 0.6 else energy
-
-    def build_day_slots(day_short: str):
-        """Return (day_start_datetime, list_of_bool_slots) for a weekday."""
-        base = date.fromisoformat(upcoming_week_dates[day_short])
-        start_dt = datetime.combine(base, datetime.min.time()).replace(hour=DEFAULT_DAY_START)
-        end_dt   = start_dt.replace(hour=DEFAULT_DAY_END)
-        total_slots = int((end_dt - start_dt).seconds / (SLOT_MINUTES * 60))
-        slots = [True] * total_slots
-        for b in availability.get(day_short, []):
-            try:
-                s_h, s_m = map(int, b["start"].split(":"))
-                e_h, e_m = map(int, b["end"].split(":"))
-                block_start = start_dt.replace(hour=s_h, minute=s_m)
-                block_end   = start_dt.replace(hour=e_h, minute=e_m)
-                if block_end <= start_dt or block_start >= end_dt:
-                    continue
-                bs = max(0, int((block_start - start_dt).seconds / (SLOT_MINUTES * 60)))
-                be = min(total_slots, int((block_end - start_dt).seconds / (SLOT_MINUTES * 60)))
-                for i in range(bs, be):
-                    slots[i] = False
-            except Exception:
-                logger.exception("Error parsing block times for %s: %s", day_short, b)
-        return start_dt, slots
-
-    def find_all_fits(slots: list, blocks_needed: int) -> list:
-        """Return all valid starting indices where `blocks_needed` consecutive free slots exist."""
-        valid = []
-        for i in range(len(slots) - blocks_needed + 1):
-            if all(slots[i:i + blocks_needed]):
-                valid.append(i)
-        return valid
-
-    # --- Compute upcoming week dates ---
-    today_date = date.today()
-    days_until_next_monday = 7 - today_date.weekday()
-    next_monday = today_date + timedelta(days=days_until_next_monday)
-    week_days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    upcoming_week_dates = {
-        dname: (next_monday + timedelta(days=i)).isoformat()
-        for i, dname in enumerate(week_days)
+    stats = plan["stats"]
+    stats["timings_ms"]["load"] = round((loaded - started) * 1000, 3)
+    return {
+        "token": token,
+        "expires_in": int(expires.total_seconds()),
+        "week_start": next_monday.isoformat(),
+        "sessions": [
+            {
+                "timer_type":       session["course"],
+                "duration_minutes": session["duration_minutes"],
+                "focus_minutes":    session["focus_minutes"],
+                "break_minutes":    session["break_minutes"],
+                "started_at":       session["started_at"].isoformat(),
+                "ended_at":         session["ended_at"].isoformat(),
+            }
+            for session in plan["sessions"]
+        ],
+        "stats": stats,
     }
 
-    # --- Build course records with weekly time budget ---
-    course_records = []
-    for c in courses:
-        ects = extract_ects(c.description or "")
-        weekly_minutes = int(round((ects * MINUTES_PER_ECTS_TOTAL) / max(1, WEEKS_PER_TERM)))
-        course_records.append({"name": c.name, "ects": ects, "weekly_minutes": weekly_minutes, "remaining": weekly_minutes})
-
-    if course_records and all(cr["weekly_minutes"] == 0 for cr in course_records):
-        DEFAULT_WEEKLY_PER_COURSE = 120
-        for cr in course_records:
-            cr["weekly_minutes"] = DEFAULT_WEEKLY_PER_COURSE
-            cr["remaining"]      = DEFAULT_WEEKLY_PER_COURSE
-
-    total_week_minutes = sum(cr["weekly_minutes"] for cr in course_records)
-    if total_week_minutes <= 0:
-        raise HTTPException(status_code=400, detail="No weekly minutes to schedule")
-
-    # --- Personality / energy ---
-    C = get_personality("conscientiousness", 3.0)
-    N = get_personality("neuroticism",       3.0)
-    daily_energy = compute_daily_energy(emotion_scores)
-
-    # Focus duration per session (minutes)
-    raw_focus  = int(round((C - N + 0.5 * daily_energy) * 10))
-    focus_base = max(MIN_FOCUS_PER_SESSION, min(MAX_FOCUS_PER_SESSION, raw_focus))
-
-    # --- Build slot maps for each day ---
-    day_start_and_slots: dict = {}
-    available_days: list = []
-    for d in week_days:
-        start_dt, slots = build_day_slots(d)
-        day_start_and_slots[d] = (start_dt, slots)
-        if any(slots):
-            available_days.append(d)
-
-    if not available_days:
-        logger.warning("No free slots for user %s; falling back to default window", username)
-        default_slots = int(((DEFAULT_DAY_END - DEFAULT_DAY_START) * 60) / SLOT_MINUTES)
-        for d in week_days:
-            base_dt = datetime.combine(date.fromisoformat(upcoming_week_dates[d]), datetime.min.time()).replace(hour=DEFAULT_DAY_START)
-            day_start_and_slots[d] = (base_dt, [True] * default_slots)
-        available_days = week_days[:]
-
-    # =========================================================
-    # PHASE 1 – Calculate total study sessions for the week
-    # =========================================================
-    # Per-day session count driven by personality + emotion
-    raw_count = int(round(C + 0.5 * daily_energy))
-    sessions_per_day = max(MIN_SESSIONS_PER_DAY, min(MAX_SESSIONS_PER_DAY, raw_count))
-
-    total_sessions = sessions_per_day * len(available_days)
-    logger.info("Scheduling %d total sessions across %d days (%d/day) for %s",
-                total_sessions, len(available_days), sessions_per_day, username)
-
-    # =========================================================
-    # PHASE 2 – Distribute courses among those sessions
-    # =========================================================
-    # Each course gets a share of sessions proportional to its weekly_minutes budget.
-    course_records.sort(key=lambda x: x["weekly_minutes"], reverse=True)
-
-    # Compute session counts per course (proportional, at least 1 each)
-    raw_shares = [
-        max(1, round(cr["weekly_minutes"] / total_week_minutes * total_sessions))
-        for cr in course_records
-    ]
-    # Adjust so sum equals total_sessions
-    share_sum = sum(raw_shares)
-    if share_sum != total_sessions:
-        diff = total_sessions - share_sum
-        # Add/remove from the course with the largest budget
-        raw_shares[0] = max(1, raw_shares[0] + diff)
-
-    # Build flat ordered list of (course_record, focus_minutes) assignments
-    # =========================================================
-    # PHASE 3 – Calculate duration for each session
-    # =========================================================
-    session_assignments = []  # list of dicts: {course, focus}
-    for cr, n_sessions in zip(course_records, raw_shares):
-        # Spread the course budget evenly across its allocated sessions
-        per_session = max(
-            MIN_FOCUS_PER_SESSION,
-            min(focus_base, cr["weekly_minutes"] // max(1, n_sessions))
-        )
-        for _ in range(n_sessions):
-            session_assignments.append({"course": cr, "focus": per_session})
-
-    # Shuffle to avoid same-course clustering on the same day
-    random.shuffle(session_assignments)
-
-    # Distribute sessions across available days (round-robin by day order)
-    day_session_map: dict = {d: [] for d in available_days}
-    day_cycle = list(available_days)
-    for idx, sa in enumerate(session_assignments):
-        target_day = day_cycle[idx % len(day_cycle)]
-        day_session_map[target_day].append(sa)
-
-    # =========================================================
-    # PHASE 4 – Place sessions as consecutive blocks, randomly in the day
-    # =========================================================
-    # Sessions are grouped into 1–3 study blocks per day.
-    # Each block is placed as a single contiguous unit at a random free position.
-    # If the whole block doesn't fit, sessions fall back to individual random placement.
-    
-    # ≤ 2 sessions → 1 block
-    # 3–4 sessions → 2 blocks
-    # 5+ sessions → 3 blocks
-
-    def resolve_session_slots(sa: dict) -> dict | None:
-        """Resolve final focus minutes and slot count for a session assignment.
-        Returns a dict {course, focus, blocks} or None if it cannot fit at all."""
-        cr    = sa["course"]
-        focus = sa["focus"]
-        if cr["remaining"] <= 0:
-            return None
-        focus = min(focus, cr["remaining"])
-        if focus < MIN_FOCUS_PER_SESSION:
-            return None
-        break_min = 5
-        bk = max(1, (focus + break_min + SLOT_MINUTES - 1) // SLOT_MINUTES)
-        return {"course": cr, "focus": focus, "blocks": bk}
-
-    def commit_session(cr: dict, fit: int, bk: int, slots: list, start_dt: datetime, day: str):
-        """Mark slots as occupied and persist a StudySession. Returns created dict or None."""
-        for i in range(fit, fit + bk):
-            slots[i] = False
-        session_start     = start_dt + timedelta(minutes=fit * SLOT_MINUTES)
-        session_end       = session_start + timedelta(minutes=bk * SLOT_MINUTES)
-        allocated_minutes = bk * SLOT_MINUTES
-        actual_focus      = min(cr["focus"], allocated_minutes)
-        actual_break      = allocated_minutes - actual_focus
-        cr["course"]["remaining"] -= actual_focus
-        try:
-            ns = StudySession(
-                username=username,
-                mode="study",
-                timer_type=cr["course"]["name"],
-                duration_minutes=allocated_minutes,
-                focus_minutes=actual_focus,
-                break_minutes=actual_break,
-                cycles=None,
-                started_at=session_start,
-                ended_at=session_end,
-            )
-            db.add(ns)
-            db.commit()
-            db.refresh(ns)
-            return {
-                "session_id":       ns.session_id,
-                "username":         ns.username,
-                "mode":             ns.mode,
-                "timer_type":       ns.timer_type,
-                "duration_minutes": ns.duration_minutes,
-                "started_at":       ns.started_at.isoformat(),
-                "ended_at":         ns.ended_at.isoformat(),
+
+@router.post("/{username}/commit")
+async def commit_local_schedule(
+    username: str,
+    payload: SchedulePreviewCommit,
+    db: Session = Depends(get_db),
+):
+    """Save a plan returned by the preview endpoint, replacing next week's plan.
+
+    Rejected with 409 when the week has rolled over or the user's courses,
+    blocks or scores changed since the preview; preview again in that case.
+    """
+    try:
+        claims = jwt.decode(payload.token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=400, detail="Invalid or expired preview token")
+    if claims.get("kind") != PREVIEW_TOKEN_KIND or claims.get("username") != username:
+        raise HTTPException(status_code=400, detail="Invalid or expired preview token")
+
+    today = date.today()
+    next_monday = upcoming_monday(today)
+    if claims["week_start"] != next_monday.isoformat():
+        raise HTTPException(status_code=409, detail="Preview is for another week")
+    inputs = load_schedule_inputs(db, [username], today).get(username)
+    if inputs is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    input_hash = store_input_hash(inputs, next_monday, claims["placer"])
+    if input_hash != claims["input_hash"]:
+        raise HTTPException(status_code=409, detail="Courses changed since the preview")
+
+    sessions = []
+    for course, start, duration, focus in claims["sessions"]:
+        started_at = datetime.fromisoformat(start)
+        sessions.append(
+            {
+                "course":           course,
+                "started_at":       started_at,
+                "ended_at":         started_at + timedelta(minutes=duration),
+                "duration_minutes": duration,
+                "focus_minutes":    focus,
+                "break_minutes":    duration - focus,
             }
-        except Exception:
-            logger.exception("Failed saving session for %s on %s", cr["course"]["name"], day)
-            return None
-
-    created = []
-    for d in week_days:
-        sessions_today = day_session_map.get(d, [])
-        if not sessions_today:
-            continue
-
-        start_dt, slots = day_start_and_slots[d]
-        slots = list(slots)  # local mutable copy
-
-        # Shuffle within the day for variety
-        random.shuffle(sessions_today)
-
-        # Resolve slot sizes for all sessions upfront
-        resolved = [r for sa in sessions_today if (r := resolve_session_slots(sa)) is not None]
-        if not resolved:
-            continue
-
-        # Decide how many blocks to split sessions into based on count
-        n = len(resolved)
-        if n <= 2:
-            num_blocks = 1
-        elif n <= 4:
-            num_blocks = 2
-        else:
-            num_blocks = 3
-
-        # Split resolved sessions into num_blocks consecutive groups
-        block_size = (n + num_blocks - 1) // num_blocks
-        study_blocks = [resolved[i:i + block_size] for i in range(0, n, block_size)]
-
-        for block in study_blocks:
-            total_block_slots = sum(s["blocks"] for s in block)
-
-            # Try to place the entire block as one contiguous chunk
-            valid_starts = find_all_fits(slots, total_block_slots)
-
-            if valid_starts:
-                # Random position for the block
-                fit    = random.choice(valid_starts)
-                cursor = fit
-                for s_info in block:
-                    result = commit_session(s_info, cursor, s_info["blocks"], slots, start_dt, d)
-                    if result:
-                        created.append(result)
-                    cursor += s_info["blocks"]
-            else:
-                # Block doesn't fit as a whole — fall back to individual random placement
-                logger.debug("Block of %d slots doesn't fit on %s; placing sessions individually", total_block_slots, d)
-                for s_info in block:
-                    bk = s_info["blocks"]
-                    vs = find_all_fits(slots, bk)
-                    # Shrink if needed
-                    if not vs:
-                        shrunk = False
-                        for f in range(s_info["focus"] - SLOT_MINUTES, MIN_FOCUS_PER_SESSION - 1, -SLOT_MINUTES):
-                            new_bk = max(1, (f + 5 + SLOT_MINUTES - 1) // SLOT_MINUTES)
-                            vs = find_all_fits(slots, new_bk)
-                            if vs:
-                                s_info["focus"]  = f
-                                s_info["blocks"] = new_bk
-                                bk               = new_bk
-                                shrunk           = True
-                                break
-                        if not shrunk:
-                            logger.debug("No slot for %s on %s; skipping", s_info["course"]["name"], d)
-                            continue
-                    fit    = random.choice(vs)
-                    result = commit_session(s_info, fit, bk, slots, start_dt, d)
-                    if result:
-                        created.append(result)
-
-    return {"created": len(created), "sessions": created}
\ No newline at end of file
+        )
+    run = current_runs(db, [username], next_monday, lock=True).get(username)
+    return _save_plan(db, username, next_monday, run, input_hash, claims["placer"], sessions)
+
+
+@router.post("/{username}/repair")
+async def repair_local_schedule(username: str, db: Session = Depends(get_db)):
+    """Fit next week's stored plan to the current course blocks without replanning it.
+
+    Course edits already do this automatically (see courses_router); this
+    is for clients that changed blocks some other way.
+    """
+    try:
+        stats = repair_plan(db, username, date.today())
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed repairing study plan for %s", username)
+        raise HTTPException(status_code=500, detail="Failed to repair study plan")
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No study plan for next week")
+    return stats
@@ -0,0 +1,852 @@
+"""Planning core for the local scheduler (routers/scheduler.py).
+
+Nothing here touches FastAPI, the database or Gemini, so it can be used
+from jobs and benchmarks as well as the endpoint. `plan_week` takes plain
+course/block data and returns the week's sessions. Phase 4 (placing the
+sessions into free slots) is delegated to a placer from PLACERS.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Optional
+
+logger = logging.getLogger("mentora.scheduler")
+
+# Bump when the planning algorithm changes so cached runs are regenerated.
+PLANNER_VERSION = 3
+
+WEEK_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+SLOT_MINUTES = 30
+DAY_START_HOUR = 8
+DAY_END_HOUR = 22
+MINUTES_PER_ECTS_TOTAL = 1500
+WEEKS_PER_TERM = 15
+DEFAULT_WEEKLY_PER_COURSE = 120
+MIN_SESSIONS_PER_DAY = 2
+MAX_SESSIONS_PER_DAY = 6
+MIN_FOCUS_PER_SESSION = 30  # minutes
+MAX_FOCUS_PER_SESSION = 90  # minutes
+BREAK_MINUTES = 5
+
+
+def upcoming_monday(today: date) -> date:
+    """First day of the week the scheduler plans (always the next Monday)."""
+    return today + timedelta(days=7 - today.weekday())
+
+
+def schedule_input_hash(
+    week_start: date,
+    courses: list[dict],
+    blocks: list[dict],
+    personality_scores: Optional[dict],
+    emotion_scores: Optional[dict],
+    placer: str = "random",
+) -> str:
+    """Stable digest of everything a plan depends on.
+
+    `courses` and `blocks` are plain dicts; their order does not matter.
+    """
+    payload: dict[str, Any] = {
+        "version": PLANNER_VERSION,
+        "placer": placer,
+        "week_start": week_start.isoformat(),
+        "courses": sorted(courses, key=lambda c: json.dumps(c, sort_keys=True, default=str)),
+        "blocks": sorted(blocks, key=lambda b: json.dumps(b, sort_keys=True, default=str)),
+        "personality": personality_scores or {},
+        "emotion": emotion_scores or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class FreeSlots:
+    """The free 30-minute slots of one day, as a bitmask (bit i set = slot i free).
+
+    `fits(k)` returns every start of k consecutive free slots. It ANDs the
+    mask with shifted copies of itself, doubling the run length each step,
+    so it costs O(log k) word operations plus one step per result. That
+    replaces rescanning `all(slots[i:i + k])` at every index. `occupy` and
+    `release` clear or set one run of bits.
+    """
+
+    __slots__ = ("size", "mask")
+
+    def __init__(self, size: int, mask: Optional[int] = None) -> None:
+        self.size = size
+        self.mask = (1 << size) - 1 if mask is None else mask
+
+    @classmethod
+    def from_bools(cls, slots: list[bool]) -> "FreeSlots":
+        mask = 0
+        for i, free in enumerate(slots):
+            if free:
+                mask |= 1 << i
+        return cls(len(slots), mask)
+
+    def copy(self) -> "FreeSlots":
+        return FreeSlots(self.size, self.mask)
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def is_free(self, index: int) -> bool:
+        return bool(self.mask >> index & 1)
+
+    def free_count(self) -> int:
+        return self.mask.bit_count()
+
+    def occupy(self, start: int, length: int) -> None:
+        self.mask &= ~(((1 << length) - 1) << start)
+
+    def release(self, start: int, length: int) -> None:
+        self.mask |= (((1 << length) - 1) << start) & ((1 << self.size) - 1)
+
+    def fits(self, length: int) -> list[int]:
+        """All start indices with `length` consecutive free slots, ascending."""
+        if length <= 0 or length > self.size:
+            return []
+        runs = self.mask
+        span = 1
+        while span < length and runs:
+            step = min(span, length - span)
+            runs &= runs >> step
+            span += step
+        starts = []
+        while runs:
+            low = runs & -runs
+            starts.append(low.bit_length() - 1)
+            runs ^= low
+        return starts
+
+    def runs(self) -> list[tuple[int, int]]:
+        """Maximal runs of free slots as (start, length), ascending."""
+        runs = []
+        mask = self.mask
+        while mask:
+            start = (mask & -mask).bit_length() - 1
+            run = mask >> start
+            length = ((run + 1) & ~run).bit_length() - 1
+            runs.append((start, length))
+            mask &= ~(((1 << length) - 1) << start)
+        return runs
+
+    def to_bools(self) -> list[bool]:
+        return [bool(self.mask >> i & 1) for i in range(self.size)]
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+# Credit patterns, tried in order of specificity. Each captures the numeric value.
+_ECTS_PATTERNS = [
+    re.compile(pattern, re.I)
+    for pattern in (
+        # "ECTS Credits: 6" / "ECTS Credits of the Course: 6,5"
+        r"ECTS\s+Credits?[^0-9\n\r]{0,30}([0-9]+(?:[.,][0-9]+)?)",
+        # "AKTS Kredisi: 6" / "AKTS: 6"  (Turkish equivalent)
+        r"AKTS[^0-9\n\r]{0,30}([0-9]+(?:[.,][0-9]+)?)",
+        # "6 ECTS" / "6.5 ECTS" / "6,5 ECTS"
+        r"([0-9]+(?:[.,][0-9]+)?)\s*ECTS",
+        # "6 AKTS"
+        r"([0-9]+(?:[.,][0-9]+)?)\s*AKTS",
+        # Generic: "ECTS: 6" / "ects 6"
+        r"ECTS[^0-9\n\r]{0,10}([0-9]+(?:[.,][0-9]+)?)",
+        # "Credit Hours: 3" / "Credit Value: 6" / "Credits: 6"
+        r"Credits?(?:\s+(?:Hours?|Value|Points?))?\s*[:\-]?\s*([0-9]+(?:[.,][0-9]+)?)",
+        # "Course Credits: 6" / "Course Credit: 3"
+        r"Course\s+Credits?\s*[:\-]\s*([0-9]+(?:[.,][0-9]+)?)",
+        # "Kredi: 6"  (Turkish)
+        r"Kredi\s*[:\-]?\s*([0-9]+(?:[.,][0-9]+)?)",
+    )
+]
+
+
+def extract_ects(description: Optional[str]) -> float:
+    """Credit value from a course description, or 0.0 when none is found.
+
+    Stored on Course.ects whenever the description is written, so the
+    scheduler does not parse text on every run.
+    """
+    if not description:
+        return 0.0
+    for pattern in _ECTS_PATTERNS:
+        m = pattern.search(description)
+        if m:
+            value = float(m.group(1).replace(",", "."))
+            # Sanity-check: ECTS values are typically 1–30
+            if 1.0 <= value <= 30.0:
+                return value
+    return 0.0
+
+
+def personality_score(scores: Optional[dict], name: str, default: float = 3.0) -> float:
+    try:
+        return float((scores or {}).get(name, default))
+    except Exception:
+        return default
+
+
+def compute_daily_energy(em: Optional[dict]) -> float:
+    if not em:
+        return 0.0
+    joy     = em.get("joy",     0) or 0
+    neutral = em.get("neutral", 0) or 0
+    sadness = em.get("sadness", 0) or 0
+    fear    = em.get("fear",    0) or 0
+    anger   = em.get("anger",   0) or 0
+    disgust = em.get("disgust", 0) or 0
+    energy  = 8 * joy + 2 * neutral - 2.5 * (sadness + fear + anger + disgust)
+    return 0.0 if neutral > 0.6 else energy
+
+
+def slots_for_focus(focus: int) -> int:
+    """Slots needed for `focus` minutes plus the short break after it."""
+    return max(1, (focus + BREAK_MINUTES + SLOT_MINUTES - 1) // SLOT_MINUTES)
+
+
+def build_day(day: date, blocks: list[dict]) -> tuple[datetime, FreeSlots]:
+    """Return (day_start_datetime, FreeSlots) with the day's course blocks occupied."""
+    start_dt = datetime.combine(day, datetime.min.time()).replace(hour=DAY_START_HOUR)
+    end_dt   = start_dt.replace(hour=DAY_END_HOUR)
+    total_slots = int((end_dt - start_dt).seconds / (SLOT_MINUTES * 60))
+    slots = FreeSlots(total_slots)
+    for b in blocks:
+        try:
+            s_h, s_m = map(int, b["start"].split(":"))
+            e_h, e_m = map(int, b["end"].split(":"))
+            block_start = start_dt.replace(hour=s_h, minute=s_m)
+            block_end   = start_dt.replace(hour=e_h, minute=e_m)
+            if block_end <= start_dt or block_start >= end_dt:
+                continue
+            bs = max(0, int((block_start - start_dt).seconds / (SLOT_MINUTES * 60)))
+            be = min(total_slots, int((block_end - start_dt).seconds / (SLOT_MINUTES * 60)))
+            if be > bs:
+                slots.occupy(bs, be - bs)
+        except Exception:
+            logger.exception("Error parsing block times for %s: %s", day, b)
+    return start_dt, slots
+
+
+def build_week(
+    week_start: date,
+    availability: dict[str, list[dict]],
+) -> tuple[dict[str, tuple[datetime, FreeSlots]], list[str]]:
+    """Slot maps for each weekday, plus the days that have any free slot.
+
+    `availability` maps "Mon".."Sun" to that day's course blocks
+    ({"start": "HH:MM", "end": "HH:MM", ...}). A week with no free slot at
+    all falls back to the whole default window on every day.
+    """
+    week: dict[str, tuple[datetime, FreeSlots]] = {}
+    available_days: list[str] = []
+    for i, d in enumerate(WEEK_DAYS):
+        start_dt, slots = build_day(week_start + timedelta(days=i), availability.get(d, []))
+        week[d] = (start_dt, slots)
+        if slots:
+            available_days.append(d)
+
+    if not available_days:
+        logger.warning("No free slots in the week of %s; falling back to default window", week_start)
+        for i, d in enumerate(WEEK_DAYS):
+            week[d] = build_day(week_start + timedelta(days=i), [])
+        available_days = list(WEEK_DAYS)
+    return week, available_days
+
+
+def course_budgets(courses: list[dict]) -> list[dict]:
+    """Weekly minute budget per course from its ECTS, largest budget first.
+
+    `courses` are {"name", "ects"} dicts. When no course has credits, each
+    one gets DEFAULT_WEEKLY_PER_COURSE.
+    """
+    records = []
+    for c in courses:
+        ects = c.get("ects") or 0.0
+        weekly_minutes = int(round((ects * MINUTES_PER_ECTS_TOTAL) / max(1, WEEKS_PER_TERM)))
+        records.append({"name": c["name"], "ects": ects, "weekly_minutes": weekly_minutes, "remaining": weekly_minutes})
+
+    if records and all(cr["weekly_minutes"] == 0 for cr in records):
+        for cr in records:
+            cr["weekly_minutes"] = DEFAULT_WEEKLY_PER_COURSE
+            cr["remaining"]      = DEFAULT_WEEKLY_PER_COURSE
+
+    records.sort(key=lambda x: x["weekly_minutes"], reverse=True)
+    return records
+
+
+def assign_sessions(course_records: list[dict], total_sessions: int, focus_base: int) -> list[dict]:
+    """Phases 2 and 3: share `total_sessions` among the courses and size each one.
+
+    Returns {"course": record, "focus": minutes} dicts, grouped by course.
+    """
+    total_week_minutes = sum(cr["weekly_minutes"] for cr in course_records)
+    # Each course gets a share of sessions proportional to its weekly_minutes budget.
+    raw_shares = [
+        max(1, round(cr["weekly_minutes"] / total_week_minutes * total_sessions))
+        for cr in course_records
+    ]
+    # Add/remove the difference from the course with the largest budget.
+    share_sum = sum(raw_shares)
+    if share_sum != total_sessions:
+        raw_shares[0] = max(1, raw_shares[0] + total_sessions - share_sum)
+
+    assignments = []
+    for cr, n_sessions in zip(course_records, raw_shares):
+        # Spread the course budget evenly across its allocated sessions
+        per_session = max(
+            MIN_FOCUS_PER_SESSION,
+            min(focus_base, cr["weekly_minutes"] // max(1, n_sessions))
+        )
+        for _ in range(n_sessions):
+            assignments.append({"course": cr, "focus": per_session})
+    return assignments
+
+
+def _session(cr: dict, focus: int, fit: int, bk: int, start_dt: datetime) -> dict:
+    """One planned session; charges its focus minutes to the course budget."""
+    allocated_minutes = bk * SLOT_MINUTES
+    actual_focus      = min(focus, allocated_minutes)
+    cr["remaining"]  -= actual_focus
+    session_start     = start_dt + timedelta(minutes=fit * SLOT_MINUTES)
+    return {
+        "course":           cr["name"],
+        "started_at":       session_start,
+        "ended_at":         session_start + timedelta(minutes=allocated_minutes),
+        "duration_minutes": allocated_minutes,
+        "focus_minutes":    actual_focus,
+        "break_minutes":    allocated_minutes - actual_focus,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Phase 4 placers
+#
+# A placer takes the sized assignments, the week's slot maps, the days
+# with free time and the sessions-per-day target from `session_targets`,
+# and returns the sessions it placed (see `_session`). No day gets more
+# than `day_cap` sessions. It must not modify the FreeSlots in `week`.
+# ---------------------------------------------------------------------------
+
+def day_cap(sessions_per_day: int, assignment_count: int, day_count: int) -> int:
+    """Most sessions one day may hold: the target, or the round-robin share
+    when every course's minimum of one session pushes the count above it."""
+    return max(sessions_per_day, -(-assignment_count // max(1, day_count)))
+
+
+class RandomPlacer:
+    """The original phase 4, kept as the baseline.
+
+    Assignments are shuffled and dealt round-robin to the free days. Each
+    day's sessions are grouped into 1-3 study blocks, each placed as one
+    contiguous unit at a random free position. When a whole block does not
+    fit, its sessions are placed one by one, shrinking their focus in
+    30-minute steps as needed.
+    """
+
+    name = "random"
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
+        self.rng = rng or random.Random()
+
+    def place(
+        self,
+        assignments: list[dict],
+        week: dict,
+        available_days: list[str],
+        sessions_per_day: Optional[int] = None,
+    ) -> list[dict]:
+        # Dealing the assignments round-robin keeps every day within day_cap.
+        rng = self.rng
+        assignments = list(assignments)
+        # Shuffle to avoid same-course clustering on the same day
+        rng.shuffle(assignments)
+        day_session_map: dict = {d: [] for d in available_days}
+        for idx, sa in enumerate(assignments):
+            day_session_map[available_days[idx % len(available_days)]].append(sa)
+
+        placed = []
+        for d in WEEK_DAYS:
+            sessions_today = day_session_map.get(d, [])
+            if not sessions_today:
+                continue
+            start_dt, slots = week[d]
+            slots = slots.copy()
+            rng.shuffle(sessions_today)
+
+            resolved = [r for sa in sessions_today if (r := self._resolve(sa)) is not None]
+            if not resolved:
+                continue
+
+            # <= 2 sessions -> 1 block, 3-4 -> 2 blocks, 5+ -> 3 blocks
+            n = len(resolved)
+            num_blocks = 1 if n <= 2 else 2 if n <= 4 else 3
+            block_size = (n + num_blocks - 1) // num_blocks
+            study_blocks = [resolved[i:i + block_size] for i in range(0, n, block_size)]
+
+            for block in study_blocks:
+                total_block_slots = sum(s["blocks"] for s in block)
+                valid_starts = slots.fits(total_block_slots)
+                if valid_starts:
+                    cursor = rng.choice(valid_starts)
+                    for s_info in block:
+                        slots.occupy(cursor, s_info["blocks"])
+                        placed.append(_session(s_info["course"], s_info["focus"], cursor, s_info["blocks"], start_dt))
+                        cursor += s_info["blocks"]
+                    continue
+
+                logger.debug("Block of %d slots doesn't fit on %s; placing sessions individually", total_block_slots, d)
+                for s_info in block:
+                    bk = s_info["blocks"]
+                    focus = s_info["focus"]
+                    vs = slots.fits(bk)
+                    if not vs:
+                        for f in range(focus - SLOT_MINUTES, MIN_FOCUS_PER_SESSION - 1, -SLOT_MINUTES):
+                            vs = slots.fits(slots_for_focus(f))
+                            if vs:
+                                focus, bk = f, slots_for_focus(f)
+                                break
+                    if not vs:
+                        logger.debug("No slot for %s on %s; skipping", s_info["course"]["name"], d)
+                        continue
+                    fit = rng.choice(vs)
+                    slots.occupy(fit, bk)
+                    placed.append(_session(s_info["course"], focus, fit, bk, start_dt))
+        return placed
+
+    @staticmethod
+    def _resolve(sa: dict) -> Optional[dict]:
+        cr = sa["course"]
+        if cr["remaining"] <= 0:
+            return None
+        focus = min(sa["focus"], cr["remaining"])
+        if focus < MIN_FOCUS_PER_SESSION:
+            return None
+        return {"course": cr, "focus": focus, "blocks": slots_for_focus(focus)}
+
+
+class OptimizingPlacer:
+    """Deterministic placement that maximizes scheduled focus minutes.
+
+    Constraints: course blocks, MIN/MAX_FOCUS_PER_SESSION, each course's
+    weekly budget, and at most `day_cap` sessions per day. place() derives
+    the cap from the sessions-per-day target with `day_cap()`, the same
+    per-day count RandomPlacer deals out; without a target it is
+    MAX_SESSIONS_PER_DAY.
+
+    1. Greedy: assignments are taken longest first (ties by course name).
+       Each goes to the day where its course has the fewest sessions, then
+       the day with the fewest sessions, at the left end of the smallest
+       free run that holds it (best fit, which keeps long runs for long
+       sessions). If it fits nowhere, it is shortened in 30-minute steps.
+    2. Repair, until nothing improves or `time_budget_ms` runs out: an
+       assignment that was dropped or shortened may take a spot freed by
+       moving one placed session to another valid spot. Every accepted
+       move adds focus minutes, so the search terminates.
+
+    No randomness is involved: the same input gives the same plan as long
+    as the repair pass finishes within the budget, which it does for any
+    realistic week. Otherwise the best plan found so far is returned.
+    """
+
+    name = "optimal"
+
+    def __init__(self, time_budget_ms: float = 200) -> None:
+        self.time_budget_ms = time_budget_ms
+
+    def place(
+        self,
+        assignments: list[dict],
+        week: dict,
+        available_days: list[str],
+        sessions_per_day: Optional[int] = None,
+    ) -> list[dict]:
+        cap = MAX_SESSIONS_PER_DAY
+        if sessions_per_day is not None:
+            cap = day_cap(sessions_per_day, len(assignments), len(available_days))
+        deadline = time.perf_counter() + self.time_budget_ms / 1000
+        slots = {d: week[d][1].copy() for d in available_days}
+        # day -> list of [course_record, focus, start, blocks]
+        days: dict[str, list[list]] = {d: [] for d in available_days}
+        remaining = {id(sa["course"]): sa["course"]["remaining"] for sa in assignments}
+        # (course_record, wanted focus, placed focus) for everything not placed in full
+        short: list[list] = []
+
+        order = sorted(assignments, key=lambda sa: (-sa["focus"], sa["course"]["name"]))
+        for sa in order:
+            cr = sa["course"]
+            wanted = min(sa["focus"], remaining[id(cr)])
+            if wanted < MIN_FOCUS_PER_SESSION:
+                continue
+            spot = self._best_spot(cr, wanted, slots, days, cap)
+            if spot is None:
+                remaining[id(cr)] -= wanted
+                short.append([cr, wanted, 0])
+                continue
+            d, start, focus = spot
+            self._put(d, cr, focus, start, slots, days)
+            # Reserve the full length so repair can grow it back within budget.
+            remaining[id(cr)] -= wanted
+            if focus < wanted:
+                short.append([cr, wanted, focus])
+
+        self._repair(short, slots, days, cap, deadline)
+
+        placed = []
+        for d in available_days:
+            start_dt = week[d][0]
+            for cr, focus, start, bk in sorted(days[d], key=lambda p: p[2]):
+                placed.append(_session(cr, focus, start, bk, start_dt))
+        return placed
+
+    def place_one(
+        self,
+        cr: dict,
+        focus: int,
+        slots: dict,
+        days: dict,
+        cap: int,
+        floor: int = MIN_FOCUS_PER_SESSION,
+        only: Optional[list[str]] = None,
+    ) -> Optional[tuple[str, int, int]]:
+        """Place one session of `cr` at the best spot, as place() would.
+
+        `focus` is shortened down to `floor` if needed, and only days holding
+        fewer than `cap` sessions (and in `only`, when given) are considered.
+        Returns (day, start, focus), or None when nothing fits.
+        """
+        pool = days if only is None else {d: days[d] for d in only}
+        spot = self._best_spot(cr, focus, slots, pool, cap, floor)
+        if spot is not None:
+            self._put(spot[0], cr, spot[2], spot[1], slots, days)
+        return spot
+
+    @staticmethod
+    def reserve(
+        d: str, cr: dict, focus: int, start: int, blocks: int, slots: dict, days: dict
+    ) -> None:
+        """Record an existing session of `blocks` slots at `start` on day `d`."""
+        slots[d].occupy(start, blocks)
+        days[d].append([cr, focus, start, blocks])
+
+    @staticmethod
+    def _put(d: str, cr: dict, focus: int, start: int, slots: dict, days: dict) -> list:
+        entry = [cr, focus, start, slots_for_focus(focus)]
+        slots[d].occupy(start, entry[3])
+        days[d].append(entry)
+        return entry
+
+    @staticmethod
+    def _take(d: str, entry: list, slots: dict, days: dict) -> None:
+        slots[d].release(entry[2], entry[3])
+        days[d].remove(entry)
+
+    def _best_spot(
+        self,
+        cr: dict,
+        wanted: int,
+        slots: dict,
+        days: dict,
+        cap: int,
+        floor: int = MIN_FOCUS_PER_SESSION,
+        exclude: Optional[str] = None,
+    ) -> Optional[tuple[str, int, int]]:
+        """(day, start, focus) for the longest focus >= `floor` that fits on a
+        day holding fewer than `cap` sessions."""
+        for focus in range(wanted, floor - 1, -SLOT_MINUTES):
+            bk = slots_for_focus(focus)
+            best = None
+            for order, d in enumerate(days):
+                if d == exclude or len(days[d]) >= cap:
+                    continue
+                same_course = sum(1 for p in days[d] if p[0] is cr)
+                for start, length in slots[d].runs():
+                    if length < bk:
+                        continue
+                    key = (same_course, len(days[d]), length, order, start)
+                    if best is None or key < best[0]:
+                        best = (key, d, start)
+            if best is not None:
+                return best[1], best[2], focus
+        return None
+
+    def _repair(
+        self, short: list[list], slots: dict, days: dict, cap: int, deadline: float
+    ) -> None:
+        improved = True
+        while improved and short:
+            improved = False
+            for item in list(short):
+                if time.perf_counter() > deadline:
+                    return
+                if self._improve(item, slots, days, cap):
+                    improved = True
+                    if item[2] >= item[1]:
+                        short.remove(item)
+
+    def _improve(self, item: list, slots: dict, days: dict, cap: int) -> bool:
+        """Place `item` longer than now, possibly by relocating one other session."""
+        cr, wanted, current = item
+        floor = max(MIN_FOCUS_PER_SESSION, current + SLOT_MINUTES)
+        if floor > wanted:
+            return False
+        own = None
+        if current:
+            own_day = next(d for d in days for p in days[d] if p[0] is cr and p[1] == current)
+            own = next(p for p in days[own_day] if p[0] is cr and p[1] == current)
+            self._take(own_day, own, slots, days)
+
+        spot = self._best_spot(cr, wanted, slots, days, cap, floor)
+        if spot is not None:
+            d, start, focus = spot
+            self._put(d, cr, focus, start, slots, days)
+            item[2] = focus
+            return True
+
+        # Try to make room by moving one placed session elsewhere.
+        for d in days:
+            for other in list(days[d]):
+                self._take(d, other, slots, days)
+                spot = self._best_spot(cr, wanted, slots, {d: days[d]}, cap, floor)
+                if spot is not None:
+                    _, start, focus = spot
+                    mine = self._put(d, cr, focus, start, slots, days)
+                    moved = self._best_spot(other[0], other[1], slots, days, cap, other[1])
+                    if moved is not None:
+                        self._put(moved[0], other[0], other[1], moved[1], slots, days)
+                        item[2] = focus
+                        return True
+                    self._take(d, mine, slots, days)
+                self._put(d, other[0], other[1], other[2], slots, days)
+
+        if own is not None:
+            self._put(own_day, cr, current, own[2], slots, days)
+        return False
+
+
+PLACERS = {
+    RandomPlacer.name: RandomPlacer,
+    OptimizingPlacer.name: OptimizingPlacer,
+}
+
+
+def make_placer(name: str, time_budget_ms: float = 200, seed: Optional[int] = None):
+    """Instantiate a placer from PLACERS; raises ValueError for an unknown name."""
+    if name == RandomPlacer.name:
+        return RandomPlacer(random.Random(seed) if seed is not None else None)
+    if name == OptimizingPlacer.name:
+        return OptimizingPlacer(time_budget_ms)
+    raise ValueError(f"Unknown placer {name!r}; expected one of {sorted(PLACERS)}")
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+def session_targets(personality_scores: Optional[dict], emotion_scores: Optional[dict]) -> tuple[int, int]:
+    """(sessions per day, focus minutes per session) from personality and today's energy."""
+    C = personality_score(personality_scores, "conscientiousness")
+    N = personality_score(personality_scores, "neuroticism")
+    daily_energy = compute_daily_energy(emotion_scores)
+    raw_focus  = int(round((C - N + 0.5 * daily_energy) * 10))
+    focus_base = max(MIN_FOCUS_PER_SESSION, min(MAX_FOCUS_PER_SESSION, raw_focus))
+    raw_count = int(round(C + 0.5 * daily_energy))
+    sessions_per_day = max(MIN_SESSIONS_PER_DAY, min(MAX_SESSIONS_PER_DAY, raw_count))
+    return sessions_per_day, focus_base
+
+
+def plan_week(
+    week_start: date,
+    courses: list[dict],
+    availability: dict[str, list[dict]],
+    personality_scores: Optional[dict],
+    emotion_scores: Optional[dict],
+    placer=None,
+) -> dict:
+    """Plan one week of study sessions in memory.
+
+    `courses` are {"name", "ects"} dicts; `availability` is as for
+    `build_week`. Returns {"sessions": [...], "stats": {...}}. Sessions are
+    ordered by start time (see `_session` for their fields). Stats hold the
+    per-phase timings in milliseconds and how much of the request was
+    placed. Raises ValueError when there is nothing to schedule.
+    """
+    placer = placer or RandomPlacer()
+    started = time.perf_counter()
+
+    course_records = course_budgets(courses)
+    total_week_minutes = sum(cr["weekly_minutes"] for cr in course_records)
+    if total_week_minutes <= 0:
+        raise ValueError("No weekly minutes to schedule")
+    week, available_days = build_week(week_start, availability)
+    built = time.perf_counter()
+
+    sessions_per_day, focus_base = session_targets(personality_scores, emotion_scores)
+    total_sessions = sessions_per_day * len(available_days)
+    logger.info("Scheduling %d total sessions across %d days (%d/day)",
+                total_sessions, len(available_days), sessions_per_day)
+
+    assignments = assign_sessions(course_records, total_sessions, focus_base)
+    per_course: dict[str, int] = {}
+    for sa in assignments:
+        per_course[sa["course"]["name"]] = per_course.get(sa["course"]["name"], 0) + sa["focus"]
+    requested_focus = sum(min(per_course.get(cr["name"], 0), cr["weekly_minutes"]) for cr in course_records)
+    assigned = time.perf_counter()
+
+    sessions = placer.place(assignments, week, available_days, sessions_per_day)
+    sessions.sort(key=lambda s: s["started_at"])
+    placed = time.perf_counter()
+
+    return {
+        "sessions": sessions,
+        "stats": {
+            "placer": placer.name,
+            "requested_sessions": len(assignments),
+            "placed_sessions": len(sessions),
+            "week_minutes": total_week_minutes,
+            "requested_focus_minutes": requested_focus,
+            "placed_focus_minutes": sum(s["focus_minutes"] for s in sessions),
+            "timings_ms": {
+                "build": round((built - started) * 1000, 3),
+                "assign": round((assigned - built) * 1000, 3),
+                "place": round((placed - assigned) * 1000, 3),
+                "total": round((placed - started) * 1000, 3),
+            },
+        },
+    }
+
+
+def repair_week(
+    week_start: date,
+    courses: list[dict],
+    availability: dict[str, list[dict]],
+    personality_scores: Optional[dict],
+    emotion_scores: Optional[dict],
+    sessions: list[dict],
+    changed_days: Optional[set[str]] = None,
+) -> dict:
+    """Fit an existing week's plan to changed courses, touching as little as possible.
+
+    `sessions` are the stored sessions ({"session_id", "course",
+    "started_at", "ended_at", "focus_minutes"}). Sessions that still fit
+    keep their slot. A session that now collides with a course block is
+    moved: first elsewhere on the same day at the same length, then
+    anywhere, shortened if needed. Sessions of courses that no longer exist
+    are dropped. Courses left below the focus minutes a fresh plan would
+    give them get new sessions, on `changed_days` first when given.
+
+    Returns {"keep": [ids], "move": [{"session_id", ...}], "drop": [ids],
+    "add": [...], "stats": {...}}. Moved and added sessions have the
+    fields described in `_session`.
+    """
+    started = time.perf_counter()
+    course_records = course_budgets(courses)
+    by_name = {cr["name"]: cr for cr in course_records}
+    week, available_days = build_week(week_start, availability)
+
+    # What a fresh plan would ask for, per course (phases 1-3 are deterministic).
+    targets: dict[str, int] = {}
+    lengths: dict[str, int] = {}
+    if course_records and sum(cr["weekly_minutes"] for cr in course_records) > 0:
+        sessions_per_day, focus_base = session_targets(personality_scores, emotion_scores)
+        assignments = assign_sessions(course_records, sessions_per_day * len(available_days), focus_base)
+        for sa in assignments:
+            name = sa["course"]["name"]
+            targets[name] = targets.get(name, 0) + sa["focus"]
+            lengths[name] = sa["focus"]
+        for cr in course_records:
+            targets[cr["name"]] = min(targets.get(cr["name"], 0), cr["weekly_minutes"])
+
+    placer = OptimizingPlacer()
+    cap = MAX_SESSIONS_PER_DAY
+    if targets:
+        cap = day_cap(sessions_per_day, len(assignments), len(available_days))
+    slots = {d: week[d][1].copy() for d in WEEK_DAYS}
+    days: dict[str, list[list]] = {d: [] for d in WEEK_DAYS}
+    scheduled: dict[str, int] = {}
+    keep: list[int] = []
+    drop: list[int] = []
+    displaced = []
+
+    for s in sorted(sessions, key=lambda s: s["started_at"]):
+        cr = by_name.get(s["course"])
+        offset = (s["started_at"].date() - week_start).days
+        if cr is None or not 0 <= offset < len(WEEK_DAYS):
+            drop.append(s["session_id"])
+            continue
+        d = WEEK_DAYS[offset]
+        start_dt = week[d][0]
+        fit = int((s["started_at"] - start_dt).total_seconds() // (SLOT_MINUTES * 60))
+        bk = -(-int((s["ended_at"] - s["started_at"]).total_seconds()) // (SLOT_MINUTES * 60))
+        if (
+            fit >= 0
+            and fit + bk <= slots[d].size
+            and len(days[d]) < cap
+            and fit in slots[d].fits(bk)
+        ):
+            placer.reserve(d, cr, s["focus_minutes"], fit, bk, slots, days)
+            scheduled[cr["name"]] = scheduled.get(cr["name"], 0) + s["focus_minutes"]
+            keep.append(s["session_id"])
+        else:
+            displaced.append((s, d, cr))
+
+    move = []
+    for s, d, cr in displaced:
+        # Stored sessions can have 0 focus minutes; re-place those at the minimum.
+        focus = max(MIN_FOCUS_PER_SESSION, s["focus_minutes"])
+        if targets.get(cr["name"], 0) - scheduled.get(cr["name"], 0) < MIN_FOCUS_PER_SESSION:
+            # The course already has what it needs without this session.
+            drop.append(s["session_id"])
+            continue
+        spot = placer.place_one(cr, focus, slots, days, cap, floor=focus, only=[d])
+        if spot is None:
+            spot = placer.place_one(cr, focus, slots, days, cap)
+        if spot is None:
+            drop.append(s["session_id"])
+            continue
+        day, start, placed_focus = spot
+        scheduled[cr["name"]] = scheduled.get(cr["name"], 0) + placed_focus
+        moved = _session(cr, placed_focus, start, slots_for_focus(placed_focus), week[day][0])
+        moved["session_id"] = s["session_id"]
+        move.append(moved)
+
+    preferred = [d for d in WEEK_DAYS if changed_days is None or d in changed_days]
+    add = []
+    for cr in course_records:
+        name = cr["name"]
+        deficit = targets.get(name, 0) - scheduled.get(name, 0)
+        while deficit >= MIN_FOCUS_PER_SESSION:
+            focus = min(lengths.get(name, MIN_FOCUS_PER_SESSION), deficit)
+            focus = max(MIN_FOCUS_PER_SESSION, focus)
+            spot = placer.place_one(cr, focus, slots, days, cap, only=preferred)
+            if spot is None and len(preferred) < len(WEEK_DAYS):
+                spot = placer.place_one(cr, focus, slots, days, cap)
+            if spot is None:
+                break
+            day, start, placed_focus = spot
+            add.append(_session(cr, placed_focus, start, slots_for_focus(placed_focus), week[day][0]))
+            scheduled[name] = scheduled.get(name, 0) + placed_focus
+            deficit -= placed_focus
+
+    return {
+        "keep": keep,
+        "move": move,
+        "drop": drop,
+        "add": add,
+        "stats": {
+            "kept": len(keep),
+            "moved": len(move),
+            "dropped": len(drop),
+            "added": len(add),
+            "repair_ms": round((time.perf_counter() - started) * 1000, 3),
+        },
+    }
@@ -0,0 +1,282 @@
+"""Database side of the local scheduler.
+
+Loads what `schedule_planner.plan_week` needs and swaps stored weekly plans
+(ScheduleRun + StudySession rows). Every function works on a list of users
+with a fixed number of statements, so POST /scheduler/{username} (one user)
+and jobs/plan_schedules.py (thousands) share the same code. Nothing here
+commits; callers own the transaction.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import SCHEDULER_PLACER
+from models import Course, CourseBlock, Emotion, Personality, ScheduleRun, StudySession, User
+from schedule_planner import extract_ects, repair_week, schedule_input_hash, upcoming_monday
+
+
+def load_schedule_inputs(db: Session, usernames: list[str], today: date) -> dict[str, dict]:
+    """Planner inputs for each user, in five queries however many users are asked for.
+
+    Returns username -> {"user_id", "courses", "blocks", "availability",
+    "personality_scores", "emotion_scores"}. Courses carry their stored
+    ECTS; rows written before Course.ects existed are parsed on the fly.
+    Users without a User row are left out.
+    """
+    user_ids = dict(
+        db.execute(select(User.username, User.user_id).where(User.username.in_(usernames))).all()
+    )
+    inputs = {
+        username: {
+            "user_id": user_id,
+            "courses": [],
+            "blocks": [],
+            "availability": {},
+            "personality_scores": {},
+            "emotion_scores": None,
+        }
+        for username, user_id in user_ids.items()
+    }
+    by_user_id = {data["user_id"]: data for data in inputs.values()}
+
+    for course in db.scalars(
+        select(Course).where(Course.username.in_(list(inputs))).order_by(Course.course_id)
+    ):
+        ects = course.ects if course.ects is not None else extract_ects(course.description)
+        inputs[course.username]["courses"].append(
+            {"course_id": course.course_id, "name": course.name, "ects": ects}
+        )
+
+    block_rows = db.execute(
+        select(Course.username, Course.name, CourseBlock.day, CourseBlock.start, CourseBlock.end)
+        .join(Course, CourseBlock.course_id == Course.course_id)
+        .where(Course.username.in_(list(inputs)))
+        .order_by(CourseBlock.block_id)
+    ).all()
+    for username, course_name, day, start, end in block_rows:
+        data = inputs[username]
+        data["blocks"].append({"course": course_name, "day": day, "start": start, "end": end})
+        data["availability"].setdefault(day, []).append(
+            {"start": start, "end": end, "course": course_name}
+        )
+
+    # Most recent personality test per user: rows come newest first, keep the first seen.
+    seen: set[int] = set()
+    for user_id, scores in db.execute(
+        select(Personality.user_id, Personality.personality_scores)
+        .where(Personality.user_id.in_(list(by_user_id)))
+        .order_by(Personality.user_id, Personality.test_date.desc())
+    ):
+        if user_id not in seen:
+            seen.add(user_id)
+            by_user_id[user_id]["personality_scores"] = scores or {}
+
+    for user_id, scores in db.execute(
+        select(Emotion.user_id, Emotion.emotion_scores)
+        .where(Emotion.user_id.in_(list(by_user_id)))
+        .where(Emotion.emotion_test_date == today)
+    ):
+        by_user_id[user_id]["emotion_scores"] = scores
+    return inputs
+
+
+def input_hash(inputs: dict, week_start: date, placer: str) -> str:
+    return schedule_input_hash(
+        week_start,
+        [{"name": c["name"], "ects": c["ects"]} for c in inputs["courses"]],
+        inputs["blocks"],
+        inputs["personality_scores"],
+        inputs["emotion_scores"],
+        placer,
+    )
+
+
+def current_runs(
+    db: Session,
+    usernames: list[str],
+    week_start: date,
+    lock: bool = False,
+) -> dict[str, ScheduleRun]:
+    query = select(ScheduleRun).where(
+        ScheduleRun.username.in_(usernames),
+        ScheduleRun.week_start == week_start,
+    )
+    if lock:
+        query = query.with_for_update()
+    return {run.username: run for run in db.scalars(query)}
+
+
+def intact_runs(db: Session, runs: list[ScheduleRun]) -> set[int]:
+    """Ids of the runs whose sessions are all still there (none deleted by hand)."""
+    if not runs:
+        return set()
+    counts = dict(
+        db.execute(
+            select(StudySession.schedule_run_id, func.count())
+            .where(StudySession.schedule_run_id.in_([run.run_id for run in runs]))
+            .group_by(StudySession.schedule_run_id)
+        ).all()
+    )
+    return {run.run_id for run in runs if counts.get(run.run_id, 0) == run.session_count}
+
+
+def replace_plans(db: Session, week_start: date, plans: list[dict]) -> list[dict]:
+    """Swap in new weekly plans for several users at once.
+
+    Each plan is {"username", "run" (current ScheduleRun or None),
+    "input_hash", "placer", "sessions" (from plan_week)}. One DELETE drops
+    the old runs' sessions, plus unversioned ones from before runs were
+    tracked, inside the week. The run rows are then created or updated and every
+    new session goes in with one multi-row INSERT ... RETURNING. Sets
+    plan["run"] and returns the inserted rows (with session_id) in plan
+    order.
+    """
+    if not plans:
+        return []
+    week_start_dt = datetime.combine(week_start, datetime.min.time())
+    old_run_ids = [plan["run"].run_id for plan in plans if plan["run"] is not None]
+    stale = StudySession.schedule_run_id.is_(None)
+    if old_run_ids:
+        stale = or_(stale, StudySession.schedule_run_id.in_(old_run_ids))
+    db.execute(
+        delete(StudySession)
+        .where(StudySession.username.in_([plan["username"] for plan in plans]))
+        .where(StudySession.started_at >= week_start_dt)
+        .where(StudySession.started_at < week_start_dt + timedelta(days=7))
+        .where(stale)
+        .execution_options(synchronize_session=False)
+    )
+
+    now = datetime.utcnow()
+    for plan in plans:
+        run: Optional[ScheduleRun] = plan["run"]
+        if run is None:
+            run = ScheduleRun(username=plan["username"], week_start=week_start)
+            db.add(run)
+            plan["run"] = run
+        run.input_hash = plan["input_hash"]
+        run.placer = plan["placer"]
+        run.session_count = len(plan["sessions"])
+        run.created_at = now
+    db.flush()
+
+    rows = [
+        _session_row(plan["username"], plan["run"].run_id, session)
+        for plan in plans
+        for session in plan["sessions"]
+    ]
+    if rows:
+        session_ids = db.scalars(
+            insert(StudySession).returning(StudySession.session_id, sort_by_parameter_order=True),
+            rows,
+        ).all()
+        for row, session_id in zip(rows, session_ids):
+            row["session_id"] = session_id
+    return rows
+
+
+def _session_row(username: str, run_id: int, session: dict) -> dict:
+    return {
+        "username":         username,
+        "mode":             "study",
+        "timer_type":       session["course"],
+        "duration_minutes": session["duration_minutes"],
+        "focus_minutes":    session["focus_minutes"],
+        "break_minutes":    session["break_minutes"],
+        "cycles":           None,
+        "started_at":       session["started_at"],
+        "ended_at":         session["ended_at"],
+        "schedule_run_id":  run_id,
+    }
+
+
+def repair_plan(
+    db: Session,
+    username: str,
+    today: date,
+    changed_days: Optional[set[str]] = None,
+    renamed: Optional[dict[str, str]] = None,
+) -> Optional[dict]:
+    """Adjust the user's stored plan for next week after their courses changed.
+
+    Only sessions that collide with the new blocks (or belong to removed
+    courses) are touched, plus new ones for courses left short; see
+    schedule_planner.repair_week. `renamed` maps old course names to new
+    ones so their sessions follow the rename. The run's input hash is
+    updated so an unchanged POST /scheduler/{username} returns the repaired
+    plan. Returns the repair stats, or None when the user has no plan.
+    """
+    week_start = upcoming_monday(today)
+    run = current_runs(db, [username], week_start, lock=True).get(username)
+    if run is None:
+        return None
+    inputs = load_schedule_inputs(db, [username], today).get(username)
+    if inputs is None:
+        return None
+
+    stored = db.scalars(
+        select(StudySession).where(StudySession.schedule_run_id == run.run_id)
+    ).all()
+    renamed = renamed or {}
+    sessions = [
+        {
+            "session_id": s.session_id,
+            "course": renamed.get(s.timer_type, s.timer_type),
+            "started_at": s.started_at,
+            "ended_at": s.ended_at,
+            "focus_minutes": s.focus_minutes or 0,
+        }
+        for s in stored
+    ]
+    result = repair_week(
+        week_start,
+        inputs["courses"],
+        inputs["availability"],
+        inputs["personality_scores"],
+        inputs["emotion_scores"],
+        sessions,
+        changed_days,
+    )
+
+    for old, new in renamed.items():
+        db.execute(
+            update(StudySession)
+            .where(StudySession.schedule_run_id == run.run_id, StudySession.timer_type == old)
+            .values(timer_type=new)
+            .execution_options(synchronize_session=False)
+        )
+    if result["drop"]:
+        db.execute(
+            delete(StudySession)
+            .where(StudySession.session_id.in_(result["drop"]))
+            .execution_options(synchronize_session=False)
+        )
+    if result["move"]:
+        db.execute(
+            update(StudySession),
+            [
+                {
+                    "session_id":       moved["session_id"],
+                    "timer_type":       moved["course"],
+                    "duration_minutes": moved["duration_minutes"],
+                    "focus_minutes":    moved["focus_minutes"],
+                    "break_minutes":    moved["break_minutes"],
+                    "started_at":       moved["started_at"],
+                    "ended_at":         moved["ended_at"],
+                }
+                for moved in result["move"]
+            ],
+        )
+    if result["add"]:
+        db.execute(
+            insert(StudySession),
+            [_session_row(username, run.run_id, session) for session in result["add"]],
+        )
+
+    run.input_hash = input_hash(inputs, week_start, run.placer or SCHEDULER_PLACER)
+    run.session_count = len(result["keep"]) + len(result["move"]) + len(result["add"])
+    return result["stats"]
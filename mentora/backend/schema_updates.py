@@ -0,0 +1,63 @@
+"""Idempotent DDL for databases created before a model change.
+
+`Base.metadata.create_all` only creates missing tables, so indexes and
+columns added to existing tables are applied here on startup.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from config import CHAT_SEARCH_CONFIG
+
+logger = logging.getLogger("mentora.schema")
+
+SCHEMA_UPDATES: list[str] = [
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_thread_created_id "
+    "ON chat_messages (thread_id, created_at, message_id)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_thread_message "
+    "ON chat_messages (thread_id, message_id)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_participants_username_thread "
+    "ON chat_participants (username, thread_id)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_participants_thread_username "
+    "ON chat_participants (thread_id, username)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_content_fts "
+    f"ON chat_messages USING GIN (to_tsvector('{CHAT_SEARCH_CONFIG}'::regconfig, content))",
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS client_key VARCHAR(64)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_chat_messages_client_key "
+    "ON chat_messages (thread_id, sender, client_key)",
+    "ALTER TABLE chat_threads ADD COLUMN IF NOT EXISTS last_message_id INTEGER",
+    "ALTER TABLE chat_threads ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP",
+    # Fill the inbox columns for threads that predate them.
+    "UPDATE chat_threads AS t "
+    "SET last_message_id = m.message_id, last_message_at = m.created_at "
+    "FROM chat_threads AS pending "
+    "CROSS JOIN LATERAL ("
+    "  SELECT message_id, created_at FROM chat_messages "
+    "  WHERE chat_messages.thread_id = pending.thread_id "
+    "  ORDER BY created_at DESC, message_id DESC LIMIT 1"
+    ") AS m "
+    "WHERE t.thread_id = pending.thread_id AND pending.last_message_id IS NULL",
+    "ALTER TABLE chat_participants ADD COLUMN IF NOT EXISTS last_read_message_id INTEGER",
+    "ALTER TABLE chat_threads ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP",
+    "ALTER TABLE chat_participants "
+    "ADD COLUMN IF NOT EXISTS unread_count INTEGER NOT NULL DEFAULT 0",
+    # History from before read tracking is marked read once by
+    # jobs/backfill_read_watermarks.py.
+    "ALTER TABLE study_sessions ADD COLUMN IF NOT EXISTS schedule_run_id INTEGER "
+    "REFERENCES schedule_runs (run_id)",
+    "CREATE INDEX IF NOT EXISTS ix_study_sessions_schedule_run "
+    "ON study_sessions (schedule_run_id)",
+    "ALTER TABLE schedule_runs ADD COLUMN IF NOT EXISTS placer VARCHAR(20)",
+    # Filled for existing rows by jobs/backfill_course_ects.py.
+    "ALTER TABLE courses ADD COLUMN IF NOT EXISTS ects DOUBLE PRECISION",
+]
+
+
+def apply_schema_updates(engine: Engine) -> None:
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPDATES:
+            conn.execute(text(statement))
+    logger.info("Applied %d schema updates", len(SCHEMA_UPDATES))
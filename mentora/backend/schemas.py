@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class UserRegister(BaseModel):
@@ -134,6 +134,7 @@ class CourseResponse(BaseModel):
     username: str
     name: str
     description: Optional[str]
+    ects: Optional[float] = None
     instructor: Optional[str]
     location: Optional[str]
     color: Optional[str]
@@ -143,6 +144,10 @@ class CourseResponse(BaseModel):
         from_attributes = True
 
 
+class SchedulePreviewCommit(BaseModel):
+    token: str
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -228,6 +233,7 @@ class ChatMessageCreate(BaseModel):
     thread_id: int
     sender: str
     content: str
+    client_key: Optional[str] = Field(default=None, max_length=64)
 
 
 class ChatMessageResponse(BaseModel):
@@ -236,11 +242,17 @@ class ChatMessageResponse(BaseModel):
     sender: str
     content: str
     created_at: datetime
+    client_key: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class ChatMessagesPage(BaseModel):
+    messages: list[ChatMessageResponse]
+    next_cursor: Optional[int] = None
+
+
 class ChatThreadItem(BaseModel):
     thread_id: int
     is_group: bool
@@ -251,12 +263,47 @@ class ChatThreadItem(BaseModel):
     members_count: int = 0
     last_message: Optional[str]
     last_message_at: Optional[datetime]
+    unread_count: int = 0
+    last_read_message_id: Optional[int] = None
 
 
 class ChatThreadsResponse(BaseModel):
     threads: list[ChatThreadItem]
 
 
+class ChatSyncResponse(BaseModel):
+    messages: list[ChatMessageResponse]
+    threads: list[ChatThreadItem]
+    cursor: int
+    has_more: bool
+    server_time: datetime
+
+
+class ChatSearchHit(BaseModel):
+    message_id: int
+    thread_id: int
+    sender: str
+    content: str
+    created_at: datetime
+    snippet: str
+    rank: float
+
+
+class ChatSearchResponse(BaseModel):
+    hits: list[ChatSearchHit]
+    next_offset: Optional[int] = None
+
+
+class PresenceItem(BaseModel):
+    username: str
+    status: str
+    last_seen: Optional[datetime] = None
+
+
+class PresenceResponse(BaseModel):
+    friends: list[PresenceItem]
+
+
 class GroupCreate(BaseModel):
     username: str
     name: str
@@ -184,8 +184,14 @@ export default function ChatScreen() {
       if (!response.ok) {
         throw new Error("Messages failed");
       }
-      const data = (await response.json()) as ChatMessage[];
-      setMessagesByThread((prev) => ({ ...prev, [threadId]: data }));
+      const data = (await response.json()) as {
+        messages: ChatMessage[];
+        next_cursor: number | null;
+      };
+      setMessagesByThread((prev) => ({
+        ...prev,
+        [threadId]: data.messages ?? [],
+      }));
     } catch (error) {
       setMessagesByThread((prev) => ({ ...prev, [threadId]: [] }));
     } finally {